@@ -0,0 +1,50 @@
+"""Compares the VEP query modes ("hgvs" vs "region") on throughput and annotation rate.
+
+Queries the live VEP API with the same sample of records in each mode:
+
+    $ python benchmarks/query_modes.py data/test_vcf_data.txt --records 500 --batch-size 50
+"""
+import time
+import logging
+import argparse
+from itertools import islice
+from varanno.record import VEP_QUERY_MODES, annotate_batch
+from varanno.vcf import Reader
+
+
+def benchmark(records: list, query_mode: str, batch_size: int) -> dict:
+    """Annotates `records` in batches, timing the run and counting annotated variants."""
+    num_annotated = 0
+    start = time.perf_counter()
+    for i in range(0, len(records), batch_size):
+        for annotation in annotate_batch(records[i : i + batch_size], query_mode=query_mode):
+            num_annotated += annotation.variant_effect is not None
+    elapsed = time.perf_counter() - start
+
+    return {
+        "query_mode": query_mode,
+        "records": len(records),
+        "seconds": round(elapsed, 2),
+        "records_per_second": round(len(records) / elapsed, 1),
+        "pct_annotated": round(num_annotated / len(records) * 100, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("infile", help="Input VCF file")
+    parser.add_argument("--records", type=int, default=500, help="Number of records to query")
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    records = list(islice(Reader(args.infile).read(), args.records))
+
+    results = [benchmark(records, mode, args.batch_size) for mode in VEP_QUERY_MODES]
+    print("\t".join(results[0]))
+    for result in results:
+        print("\t".join(str(value) for value in result.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Compares the VCF reader backends ("text" vs "mmap") on read throughput.
+
+Reads every record of the input with each backend, taking the best of a few runs.
+Generate a large input with the synthetic VCF generator first:
+
+    $ python -m tests.synthetic 500000 /tmp/synthetic.vcf
+    $ python benchmarks/readers.py /tmp/synthetic.vcf --repeat 3
+"""
+import time
+import logging
+import argparse
+from varanno.varanno import READER_BACKENDS
+
+
+def benchmark(infile: str, backend: str, repeat: int) -> dict:
+    """Times reading all records of `infile` with the `backend` reader."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        num_records = sum(1 for _ in READER_BACKENDS[backend](infile).read())
+        timings.append(time.perf_counter() - start)
+    elapsed = min(timings)
+
+    return {
+        "reader": backend,
+        "records": num_records,
+        "seconds": round(elapsed, 2),
+        "records_per_second": round(num_records / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("infile", help="Input VCF file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend (best is kept)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = [benchmark(args.infile, backend, args.repeat) for backend in READER_BACKENDS]
+    print("\t".join(results[0]))
+    for result in results:
+        print("\t".join(str(value) for value in result.values()))
+
+
+if __name__ == "__main__":
+    main()
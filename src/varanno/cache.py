@@ -0,0 +1,95 @@
+import logging
+import threading
+from .vep import HGVSString, compact_vep_result
+
+
+log = logging.getLogger(__name__)
+
+# Default number of results kept by long-lived caches (multi-file runs, the server)
+DEFAULT_CACHE_SIZE = 200_000
+
+
+class VEPResultCache:
+    """Thread-safe in-memory cache of VEP results, keyed by HGVS notation.
+
+    Shared between files (or jobs) so that each distinct notation is queried once.
+    Notations already being queried by another thread are not re-sent: the caller
+    waits for that query to finish and reuses its result.
+
+    Results are stored compacted to the fields read from them (see
+    `compact_vep_result`). If `max_size` is set, the oldest results are evicted
+    once the cache is full.
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.max_size = max_size
+        self._results: dict[HGVSString, dict] = {}
+        self._pending: dict[HGVSString, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, hgvs: HGVSString):
+        return hgvs in self._results
+
+    def fetch(self, hgvs_strings: list[HGVSString], query) -> list[dict]:
+        """Returns one result per notation, querying only the notations not cached or in flight.
+
+        `query` must return one result per notation it is given, in the same order.
+        """
+        with self._lock:
+            missing, waiting = [], []
+            for hgvs in dict.fromkeys(hgvs_strings):
+                if hgvs in self._results:
+                    continue
+                if hgvs in self._pending:
+                    waiting.append(self._pending[hgvs])
+                else:
+                    self._pending[hgvs] = threading.Event()
+                    missing.append(hgvs)
+
+            self.misses += len(missing)
+            self.hits += len(hgvs_strings) - len(missing)
+
+        fetched = {}
+        if missing:
+            try:
+                fetched = dict(zip(missing, map(compact_vep_result, query(missing))))
+                with self._lock:
+                    self._results.update(fetched)
+                    self._evict()
+            finally:
+                with self._lock:
+                    for hgvs in missing:
+                        self._pending.pop(hgvs).set()
+
+        for event in waiting:
+            event.wait()
+
+        with self._lock:
+            found = {
+                hgvs: self._results[hgvs]
+                for hgvs in hgvs_strings
+                if hgvs in self._results
+            }
+        found.update(fetched)
+
+        # A concurrent query may have failed (or its results been evicted), so fetch again
+        if failed := [
+            hgvs for hgvs in dict.fromkeys(hgvs_strings) if hgvs not in found
+        ]:
+            log.info(
+                f"Refetching {len(failed)} notations missing after a concurrent query"
+            )
+            found.update(zip(failed, self.fetch(failed, query)))
+
+        return [found[hgvs] for hgvs in hgvs_strings]
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        while len(self._results) > self.max_size:
+            del self._results[next(iter(self._results))]
@@ -1,12 +1,42 @@
+import sys
+import json
 import argparse
-from .varanno import VCFProcessor
+from .cache import DEFAULT_CACHE_SIZE, VEPResultCache
+from .degraded import backfill
+from .extsort import SORT_BUFFER_MB
+from .fileio import read_manifest
+from .genes import GeneIndex, load_gene_index
+from .preview import PREVIEW_STRATA
+from .reference import ReferenceGenome
+from .record import OFF_TARGET, QUERY_MODES, VEP_QUERY_MODES
+from .targets import TARGET_MODES, TargetRegions
+from .varanno import (
+    VCFProcessor,
+    READER_BACKENDS,
+    OUTPUT_FORMATS,
+    process_many,
+    stdout_handler,
+)
+from .server import serve, submit, DEFAULT_HOST, DEFAULT_PORT
 
 
 def parse_args():
     """Parse args when provided via command line."""
     parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-f", "--file", required=True, dest="infile", help="Input VCF file to process."
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
+        "-f",
+        "--file",
+        nargs="+",
+        dest="infiles",
+        help=(
+            "Input VCF file(s) to process ('-' reads from stdin). With several files, "
+            "each gets its own directory within the output destination."
+        ),
+    )
+    inputs.add_argument(
+        "--manifest",
+        help="Text file listing input VCF files to process, one per line.",
     )
     parser.add_argument(
         "-o",
@@ -16,9 +46,367 @@ def parse_args():
         help="Output destination for annotation results",
         default="varanno_output",
     )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of files to process in parallel when given several input files",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=(
+            "Maximum number of VEP results shared between files in memory when given "
+            f"several input files (default: {DEFAULT_CACHE_SIZE})"
+        ),
+    )
+    parser.add_argument(
+        "--reader",
+        dest="reader_backend",
+        choices=READER_BACKENDS,
+        default="text",
+        help="VCF reader backend: 'text' (default) or 'mmap' (memory-mapped, faster for large files)",
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Compute each batch's annotations column-wise with numpy (same output rows)",
+    )
+    parser.add_argument(
+        "--query-mode",
+        choices=QUERY_MODES,
+        default="hgvs",
+        help=(
+            "VEP endpoint to query: 'hgvs' (HGVS notations, default) or 'region' "
+            "(VCF-style variant strings built from CHROM/POS/ID/REF/ALT), or 'genes' "
+            "to skip VEP and only assign gene_ids from --gene-index"
+        ),
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help=(
+            "Annotations output: 'csv' (default), or 'vcf' to write the input VCF back "
+            "out with the annotations appended as INFO keys"
+        ),
+    )
+    parser.add_argument(
+        "--stdout",
+        action="store_true",
+        dest="stream_output",
+        help="Stream annotations to stdout (logs go to stderr, other files to the output destination)",
+    )
+    parser.add_argument(
+        "--filter",
+        action="append",
+        dest="filters",
+        metavar="EXPR",
+        help=(
+            "Only annotate records matching EXPR, e.g. 'FILTER==PASS', 'QUAL>=30', "
+            "'CHROM in 1,2', 'INFO.TC>100' or 'GT!=homozygous_ref'. Can be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--field",
+        action="append",
+        dest="fields",
+        metavar="FIELD",
+        help=(
+            "Extra INFO or FORMAT field to output as a column typed by its header "
+            "declaration, e.g. 'INFO.QD' or 'FORMAT.GQ'. Can be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--reference",
+        metavar="FASTA",
+        help=(
+            "Reference FASTA (with a .fai index) to left-align and trim REF/ALT against "
+            "before building VEP notations, so differently written indels match"
+        ),
+    )
+    parser.add_argument(
+        "--targets",
+        metavar="BED",
+        help="BED file of target regions (e.g. exome capture intervals)",
+    )
+    parser.add_argument(
+        "--off-target",
+        dest="target_mode",
+        choices=TARGET_MODES,
+        default="drop",
+        help=(
+            "Drop records outside the --targets regions (default), or tag them "
+            f"'{OFF_TARGET}' in FILTER and output them without querying VEP"
+        ),
+    )
+    parser.add_argument(
+        "--gene-index",
+        metavar="PATH",
+        help=(
+            "Gene index (from `varanno index-genes`) or GTF/BED gene annotation file, "
+            "used to assign gene_ids by overlap where VEP has none"
+        ),
+    )
+    parser.add_argument(
+        "--store",
+        metavar="PATH",
+        help=(
+            "Load annotations into an indexed SQLite store at PATH instead of writing "
+            "annotations.csv. Several files (and runs) can share one store."
+        ),
+    )
+    parser.add_argument(
+        "--preview",
+        type=int,
+        metavar="N",
+        help=(
+            "Quick QC preview: annotate a random sample of N records (per stratum with "
+            "--preview-by), with summary counts extrapolated to the whole file"
+        ),
+    )
+    parser.add_argument(
+        "--preview-by",
+        choices=PREVIEW_STRATA,
+        help="Sample the preview separately for each CHROM or FILTER value",
+    )
+    parser.add_argument(
+        "--max-vep-failures",
+        type=int,
+        default=None,
+        help=(
+            "Degraded mode: stop querying VEP after this many consecutive failed batches, "
+            "writing read-derived fields only and queueing notations for `varanno backfill`"
+        ),
+    )
+    parser.add_argument(
+        "--vep-deadline",
+        type=float,
+        default=None,
+        help="Degraded mode: count VEP batches slower than this many seconds as failures",
+    )
+    parser.add_argument(
+        "--sort",
+        dest="sort_output",
+        action="store_true",
+        help=(
+            "Write the annotations sorted by (CHROM, POS), e.g. for inputs concatenated "
+            "from per-chromosome call sets"
+        ),
+    )
+    parser.add_argument(
+        "--sort-buffer",
+        type=float,
+        default=SORT_BUFFER_MB,
+        metavar="MB",
+        help=(
+            "Memory budget of --sort: sorted runs are spilled to temporary files in the "
+            f"output directory and merged once it is full (default {SORT_BUFFER_MB})"
+        ),
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Print the planned VEP queries (records, unique and invalid notations, batches, "
+            "estimated wall time) as JSON, without querying VEP or writing any output"
+        ),
+    )
+    parser.add_argument(
+        "--latency-from",
+        metavar="PATH",
+        help=(
+            "Dry run: metadata.json (or output directory) of a previous run, whose "
+            "recorded VEP batch latency is used to estimate the wall time"
+        ),
+    )
     return parser.parse_args()
 
 
+def parse_serve_args(argv: list[str]):
+    """Parse args for `varanno serve`."""
+    parser = argparse.ArgumentParser(
+        prog="varanno serve",
+        description="Run a local annotation server which keeps VEP connections and results warm across jobs.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port to listen on"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=f"Maximum number of VEP results to keep in memory (default: {DEFAULT_CACHE_SIZE})",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_submit_args(argv: list[str]):
+    """Parse args for `varanno submit`."""
+    parser = argparse.ArgumentParser(
+        prog="varanno submit",
+        description="Submit a VCF file to a running annotation server, streaming annotations to stdout.",
+    )
+    parser.add_argument(
+        "-f", "--file", required=True, dest="infile", help="Input VCF file"
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Server port")
+    parser.add_argument(
+        "--filter",
+        action="append",
+        dest="filters",
+        metavar="EXPR",
+        help="See `varanno --help`",
+    )
+    parser.add_argument(
+        "--query-mode",
+        choices=VEP_QUERY_MODES,
+        default="hgvs",
+        help="VEP endpoint to query: 'hgvs' (default) or 'region', see `varanno --help`",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_backfill_args(argv: list[str]):
+    """Parse args for `varanno backfill`."""
+    parser = argparse.ArgumentParser(
+        prog="varanno backfill",
+        description="Query VEP for the notations queued during a degraded run and patch them into its annotations.",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        required=True,
+        dest="outdir",
+        help="Output directory of the degraded run",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=50, help="Number of notations per VEP query"
+    )
+    return parser.parse_args(argv)
+
+
+def parse_index_genes_args(argv: list[str]):
+    """Parse args for `varanno index-genes`."""
+    parser = argparse.ArgumentParser(
+        prog="varanno index-genes",
+        description="Build a gene interval index from a GTF or BED file, for --gene-index.",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        dest="annotation_file",
+        help="GTF or BED file (.gz allowed)",
+    )
+    parser.add_argument(
+        "-o", "--out", required=True, dest="outdir", help="Index output directory"
+    )
+    return parser.parse_args(argv)
+
+
+def run_serve(argv: list[str]):
+    args = parse_serve_args(argv)
+    serve(args.host, args.port, cache_size=args.cache_size)
+
+
+def run_submit(argv: list[str]):
+    args = parse_submit_args(argv)
+
+    # Keep stdout clean for annotation rows
+    stdout_handler.setStream(sys.stderr)
+    if not submit(
+        args.infile,
+        args.host,
+        args.port,
+        filters=args.filters,
+        query_mode=args.query_mode,
+    ):
+        sys.exit(1)
+
+
+def run_backfill(argv: list[str]):
+    args = parse_backfill_args(argv)
+    if backfill(args.outdir, batch_size=args.batch_size):
+        sys.exit(1)
+
+
+def run_index_genes(argv: list[str]):
+    args = parse_index_genes_args(argv)
+    GeneIndex.from_file(args.annotation_file).save(args.outdir)
+
+
+COMMANDS = {
+    "serve": run_serve,
+    "submit": run_submit,
+    "backfill": run_backfill,
+    "index-genes": run_index_genes,
+}
+
+
 def run_annotation():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        return COMMANDS[sys.argv[1]](sys.argv[2:])
+
     args = parse_args()
-    VCFProcessor(args.infile, args.outdest).process()
+    infiles = read_manifest(args.manifest) if args.manifest else args.infiles
+    options = dict(
+        reader_backend=args.reader_backend,
+        filters=args.filters,
+        query_mode=args.query_mode,
+        max_vep_failures=args.max_vep_failures,
+        vep_deadline=args.vep_deadline,
+        store=args.store,
+        gene_index=load_gene_index(args.gene_index) if args.gene_index else None,
+        preview=args.preview,
+        preview_by=args.preview_by,
+        fields=args.fields,
+        reference=ReferenceGenome(args.reference) if args.reference else None,
+        output_format=args.output_format,
+        targets=TargetRegions.from_bed(args.targets) if args.targets else None,
+        target_mode=args.target_mode,
+        sort_output=args.sort_output,
+        sort_buffer=args.sort_buffer,
+        columnar=args.columnar,
+    )
+
+    if (args.max_vep_failures is not None or args.vep_deadline is not None) and (
+        args.output_format != "csv" or args.store or args.stream_output
+    ):
+        sys.exit(
+            "--max-vep-failures and --vep-deadline can't be combined with "
+            "--output-format vcf, --store or --stdout (backfill patches CSV files only)"
+        )
+
+    if args.dry_run:
+        stdout_handler.setStream(sys.stderr)
+        plans = {
+            infile: VCFProcessor(infile, args.outdest, **options)
+            .dry_run(args.latency_from)
+            .to_dict()
+            for infile in infiles
+        }
+        print(json.dumps(plans, indent=2))
+        return
+
+    if args.stream_output and args.store:
+        sys.exit("--stdout can't be combined with --store")
+
+    if len(infiles) == 1 and not args.manifest:
+        VCFProcessor(
+            infiles[0], args.outdest, stream_output=args.stream_output, **options
+        ).process()
+        return
+
+    if args.stream_output or "-" in infiles:
+        sys.exit("stdin/stdout streaming is only supported for a single input file")
+
+    cache = VEPResultCache(max_size=args.cache_size)
+    if process_many(
+        infiles, args.outdest, workers=args.workers, cache=cache, **options
+    ):
+        sys.exit(1)
@@ -0,0 +1,175 @@
+import re
+import logging
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
+from dataclasses import dataclass, field
+from .allele import variant_type, parse_genotype
+from .record import Record, VariantAnnotation, fetch_vep_results
+from .vep import (
+    find_vep_gene_id,
+    find_vep_maf,
+    find_vep_allele_string,
+    find_vep_variant_effect,
+)
+
+
+log = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = (
+    "minor_allele_frequency",
+    "depth_of_sequence_coverage",
+    "num_reads_supporting_variant",
+    "pct_reads_supporting_variant",
+)
+
+
+def info_values(records: list[Record], key: str) -> list[str | None]:
+    """Extracts the raw value of an INFO key from every record (None if absent)."""
+    regex = re.compile(rf"(?:^|;){re.escape(key)}=([^;]*)")
+    return [m.group(1) if (m := regex.search(rec.INFO)) else None for rec in records]
+
+
+def format_values(records: list[Record], key: str) -> list[str | None]:
+    """Extracts the raw value of a FORMAT key from every record's SAMPLE (None if absent)."""
+    values: list[str | None] = []
+    for rec in records:
+        if not (rec.FORMAT and rec.SAMPLE) or key not in (
+            keys := rec.FORMAT.split(":")
+        ):
+            values.append(None)
+            continue
+
+        fields = rec.SAMPLE.split(":")
+        idx = keys.index(key)
+        values.append(fields[idx] if idx < len(fields) else None)
+    return values
+
+
+def to_numeric(values: list) -> np.ndarray:
+    """Converts values to a float array in one vectorized pass. Non-numeric values become NaN."""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(
+        dtype=np.float64
+    )
+
+
+def non_numeric(values: list[str | None], numbers: np.ndarray) -> dict[int, str]:
+    """The values which failed to convert to `numbers` (NaN), by index."""
+    return {
+        i: value for i, value in enumerate(values) if value and np.isnan(numbers[i])
+    }
+
+
+def pct_reads_supporting_variant(num_var_reads: np.ndarray, total_coverage: np.ndarray):
+    """Vectorized `record.pct_reads_supporting_variant`. NaN where either value is missing or coverage is zero."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.round(num_var_reads / total_coverage * 100, 4)
+    pct[~(total_coverage > 0)] = np.nan
+    return pct
+
+
+@dataclass(slots=True)
+class AnnotationBatch:
+    """Annotations for a batch of records, stored column-wise.
+
+    Numeric columns are float64 numpy arrays (NaN for missing values), the others are lists.
+    Columns follow the field order of `VariantAnnotation`. `raw` holds the original
+    values which aren't numbers (e.g. multi-allelic NV "208,95"), by column and row
+    index, so `rows()` matches `annotation_factory`.
+    """
+
+    columns: dict[str, np.ndarray | list]
+    raw: dict[str, dict[int, str]] = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.columns["CHROM"])
+
+    def rows(self):
+        """Yields per-record `VariantAnnotation` objects.
+
+        NaN values become None, or the original value if it wasn't a number.
+        """
+        for i in range(len(self)):
+            values = {key: col[i] for key, col in self.columns.items()}
+            for key in NUMERIC_FIELDS:
+                if np.isnan(values[key]):
+                    values[key] = self.raw.get(key, {}).get(i)
+                else:
+                    values[key] = float(values[key])
+            yield VariantAnnotation(**values)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns, columns=VariantAnnotation.__slots__)
+
+
+def annotate_batch_columnar(
+    records: list[Record],
+    vep_results: list[dict] | None = None,
+    cache=None,
+    query_mode: str = "hgvs",
+    breaker=None,
+    gene_index=None,
+):
+    """Generates annotations for a batch of VCF records as an `AnnotationBatch`.
+
+    Read-derived fields (coverage, supporting reads and their percentage) are
+    computed with array operations over the whole batch. Values which aren't numbers
+    (e.g. multi-allelic NV "208,95") are NaN in the arrays and kept in the batch's
+    `raw` values. Missing gene_ids are looked up in `gene_index` (if given) in one
+    vectorized pass.
+    """
+    if vep_results is None:
+        vep_results = fetch_vep_results(records, cache, query_mode, breaker)
+
+    # Depth of sequence coverage and number of reads supporting the variant.
+    raw_coverage = info_values(records, "TC")
+    raw_var_reads = format_values(records, "NV")
+    total_coverage = to_numeric(raw_coverage)
+    num_var_reads = to_numeric(raw_var_reads)
+
+    genotypes = [
+        parse_genotype(gt) if gt else None for gt in format_values(records, "GT")
+    ]
+    if num_unknown := genotypes.count(None):
+        log.warning(
+            f"Failed to parse genotype for {num_unknown} records, setting to 'unknown'"
+        )
+
+    allele_strings = [find_vep_allele_string(data) for data in vep_results]
+
+    gene_ids = [find_vep_gene_id(data) for data in vep_results]
+    if gene_index is not None and None in gene_ids:
+        missing = [i for i, gene_id in enumerate(gene_ids) if gene_id is None]
+        found = gene_index.lookup_many(
+            [records[i].CHROM for i in missing], [int(records[i].POS) for i in missing]
+        )
+        for i, gene_id in zip(missing, found):
+            gene_ids[i] = gene_id
+
+    return AnnotationBatch(
+        columns={
+            "CHROM": [rec.CHROM for rec in records],
+            "POS": [rec.POS for rec in records],
+            "ID": [rec.ID for rec in records],
+            "REF": [rec.REF for rec in records],
+            "ALT": [rec.ALT for rec in records],
+            "hgvs": [rec.hgvs for rec in records],
+            "gene_id": gene_ids,
+            "allele_string": allele_strings,
+            "variant_type": [variant_type(a) if a else None for a in allele_strings],
+            "variant_effect": [find_vep_variant_effect(data) for data in vep_results],
+            "minor_allele_frequency": to_numeric(
+                [find_vep_maf(data, rec.ALT) for rec, data in zip(records, vep_results)]
+            ),
+            "depth_of_sequence_coverage": total_coverage,
+            "num_reads_supporting_variant": num_var_reads,
+            "pct_reads_supporting_variant": pct_reads_supporting_variant(
+                num_var_reads, total_coverage
+            ),
+            "genotype": [gt or "unknown" for gt in genotypes],
+            "vep_error": [data.get("error") for data in vep_results],
+        },
+        raw={
+            "depth_of_sequence_coverage": non_numeric(raw_coverage, total_coverage),
+            "num_reads_supporting_variant": non_numeric(raw_var_reads, num_var_reads),
+        },
+    )
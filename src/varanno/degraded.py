@@ -0,0 +1,209 @@
+import os
+import csv
+import time
+import logging
+import threading
+import requests
+from typing import Any
+from .record import (
+    VariantAnnotation,
+    query_vep_hgvs,
+    query_vep_region,
+    vep_annotation_fields,
+)
+from .fileio import write_metadata_json
+from .summary import AnnotationSummary
+from .utils import cast_float
+from .vep import vcf_variant_string
+
+
+log = logging.getLogger(__name__)
+
+DEGRADED_ERROR = "VEP unavailable, queued for backfill"
+
+# Timeout of each VEP request (in seconds) when the breaker has no deadline
+REQUEST_TIMEOUT = 120
+
+
+class CircuitBreaker:
+    """Stops querying VEP after repeated failures, queueing notations for a later backfill.
+
+    Any failed batch (or one slower than `deadline` seconds) counts as a failure.
+    Each VEP request times out after `deadline` seconds (`REQUEST_TIMEOUT` if no
+    deadline is set), so a hung endpoint fails the batch instead of blocking the run.
+    A failed batch gets error results and its notations are appended to `queue_file`,
+    so the run continues with read-derived fields only. After `max_failures`
+    consecutive failures the breaker opens: VEP is no longer queried and every
+    following batch is queued straight away. If `cooldown` is set, one batch is
+    tried again once that many seconds have passed since the breaker opened.
+    """
+
+    def __init__(
+        self,
+        queue_file: str,
+        max_failures: int = 3,
+        deadline: float | None = None,
+        cooldown: float | None = None,
+        query_mode: str = "hgvs",
+    ):
+        self.queue_file = queue_file
+        self.max_failures = max_failures
+        self.deadline = deadline
+        self.cooldown = cooldown
+        self.query_mode = query_mode
+        self.failures = 0
+        self.opened_at = None
+        self.num_queued = 0
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self) -> float:
+        """Timeout of each VEP request, in seconds."""
+        return self.deadline if self.deadline is not None else REQUEST_TIMEOUT
+
+    @property
+    def is_open(self) -> bool:
+        if self.opened_at is None:
+            return False
+        if (
+            self.cooldown is not None
+            and time.monotonic() - self.opened_at >= self.cooldown
+        ):
+            return False
+        return True
+
+    def call(self, notations: list[str], fetch) -> list[dict]:
+        """Fetches results with `fetch`, unless the breaker is open or the fetch fails."""
+        if self.is_open:
+            return self.enqueue(notations)
+
+        start = time.monotonic()
+        try:
+            results = fetch(notations)
+        except requests.RequestException as err:
+            # Including timeouts (`requests.Timeout`) of hung requests
+            log.warning(f"VEP query failed ({err!r}), continuing without VEP data")
+            self.record_failure()
+            return self.enqueue(notations)
+
+        elapsed = time.monotonic() - start
+        if self.deadline is not None and elapsed > self.deadline:
+            log.warning(f"VEP query took {elapsed:.1f}s (deadline {self.deadline}s)")
+            self.record_failure()
+        else:
+            self.failures = 0
+            self.opened_at = None
+        return results
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.max_failures and not self.is_open:
+            log.error(
+                f"VEP failed {self.failures} times in a row, skipping VEP queries -> {self.queue_file}"
+            )
+            self.opened_at = time.monotonic()
+
+    def enqueue(self, notations: list[str]) -> list[dict]:
+        """Appends notations to the retry queue and returns degraded results for them."""
+        with self._lock, open(self.queue_file, "at") as fle:
+            fle.writelines(f"{self.query_mode}\t{notation}\n" for notation in notations)
+            self.num_queued += len(notations)
+        return [{"input": notation, "error": DEGRADED_ERROR} for notation in notations]
+
+
+def read_retry_queue(queue_file: str) -> dict[str, list[str]]:
+    """Reads the unique queued notations, grouped by query mode."""
+    queue: dict[str, dict] = {"hgvs": {}, "region": {}}
+    with open(queue_file, "r") as fle:
+        for line in fle:
+            mode, _, notation = line.rstrip("\n").partition("\t")
+            queue[mode][notation] = None
+    return {mode: list(notations) for mode, notations in queue.items()}
+
+
+def row_notation(row: dict, query_mode: str) -> str:
+    if query_mode == "region":
+        return vcf_variant_string(
+            row["CHROM"], row["POS"], row["ID"], row["REF"], row["ALT"]
+        )
+    return row["hgvs"]
+
+
+def row_annotation(row: dict) -> VariantAnnotation:
+    """Converts an annotations CSV row back to a `VariantAnnotation` (for summaries).
+
+    Extra field columns (`--fields`) are ignored.
+    """
+    values: dict[str, Any] = {
+        key: None if row[key] == "" else cast_float(row[key])
+        for key in VariantAnnotation.__slots__
+    }
+    values.update(
+        {key: row[key] for key in ("CHROM", "POS", "ID", "REF", "ALT", "hgvs")}
+    )
+    return VariantAnnotation(**values)
+
+
+def backfill(outdir: str, batch_size: int = 50) -> int:
+    """Queries VEP for the notations queued during a degraded run, and patches the results in.
+
+    Only the VEP-derived columns of the matching rows in `annotations.csv` are
+    rewritten, and `summary.json` is rebuilt from the patched rows, so the VCF is
+    not reprocessed. Degraded mode is only supported for CSV output files, as they
+    are what is patched. Notations which still fail remain in the queue.
+
+    Returns the number of notations still queued.
+    """
+    queue_file = os.path.join(outdir, "retry_queue.tsv")
+    annotation_file = os.path.join(outdir, "annotations.csv")
+    summary_file = os.path.join(outdir, "summary.json")
+
+    queries = {"hgvs": query_vep_hgvs, "region": query_vep_region}
+    queue = read_retry_queue(queue_file)
+    results: dict[str, dict] = {}
+    remaining: list[tuple[str, str]] = []
+
+    for mode, notations in queue.items():
+        log.info(f"Backfilling {len(notations)} {mode} notations")
+        for i in range(0, len(notations), batch_size):
+            batch = notations[i : i + batch_size]
+            try:
+                results.update(zip(batch, queries[mode](batch, REQUEST_TIMEOUT)))
+            except requests.RequestException as err:
+                log.warning(
+                    f"VEP query failed during backfill ({err!r}), keeping batch queued"
+                )
+                remaining.extend((mode, notation) for notation in batch)
+
+    # Patch the VEP columns of the matching rows
+    summary = AnnotationSummary()
+    num_patched = 0
+    tmp_file = f"{annotation_file}.tmp"
+    with open(annotation_file, "r", newline="") as src, open(tmp_file, "wt") as dest:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dest, fieldnames=reader.fieldnames or [])
+        writer.writeheader()
+
+        for row in reader:
+            if row.get("vep_error") == DEGRADED_ERROR:
+                for mode in queue:
+                    if (result := results.get(row_notation(row, mode))) is not None:
+                        row.update(vep_annotation_fields(result, row["ALT"]))
+                        num_patched += 1
+                        break
+            summary.add(row_annotation(row))
+            writer.writerow(row)
+
+    os.replace(tmp_file, annotation_file)
+    if os.path.exists(summary_file):
+        write_metadata_json(summary.to_dict(), summary_file)
+
+    # Rewrite the queue with the notations still to do
+    if remaining:
+        with open(queue_file, "w") as fle:
+            fle.writelines(f"{mode}\t{notation}\n" for mode, notation in remaining)
+    else:
+        os.remove(queue_file)
+
+    log.info(f"Backfilled {num_patched} rows, {len(remaining)} notations still queued")
+    return len(remaining)
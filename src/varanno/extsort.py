@@ -0,0 +1,127 @@
+import os
+import heapq
+import marshal
+import logging
+import tempfile
+from dataclasses import fields
+from .record import Record, VariantAnnotation
+
+
+log = logging.getLogger(__name__)
+
+# Default memory budget of the sort buffer, in MB
+SORT_BUFFER_MB = 256
+
+# Approximate memory used by each buffered row on top of its encoded bytes
+# (bytes object header, sort key tuple and list slot)
+ROW_OVERHEAD = 160
+
+# Named chromosomes sorted after the numbered ones, in this order
+CHROM_ORDER = {"X": 0, "Y": 1, "M": 2, "MT": 2}
+
+RECORD_FIELDS = tuple(fld.name for fld in fields(Record) if fld.init)
+
+
+def chrom_key(chrom: str) -> tuple:
+    """Sort key of a chromosome name: 1-22, then X, Y, MT, then any others by name."""
+    name = chrom.removeprefix("chr")
+    if name.isdigit():
+        return (0, int(name), "")
+    if name in CHROM_ORDER:
+        return (1, CHROM_ORDER[name], "")
+    return (2, 0, name)
+
+
+def sort_key(chrom: str, pos: str | int) -> tuple:
+    return (chrom_key(chrom), int(pos))
+
+
+def variant_values(variant: VariantAnnotation) -> tuple:
+    return tuple(getattr(variant, name) for name in VariantAnnotation.__slots__)
+
+
+def encode_row(record: Record, variant: VariantAnnotation, extra: dict) -> bytes:
+    """Encodes an annotation row with marshal.
+
+    The record is only kept if its original line was (for VCF output), as the CSV
+    and store outputs don't use it.
+    """
+    rec = None
+    if record is not None and record.line is not None:
+        rec = tuple(getattr(record, name) for name in RECORD_FIELDS)
+    return marshal.dumps((rec, variant_values(variant), extra))
+
+
+def decode_row(row: tuple) -> tuple[Record | None, VariantAnnotation, dict]:
+    rec, variant, extra = row
+    return (
+        Record(*rec) if rec is not None else None,
+        VariantAnnotation(*variant),
+        extra,
+    )
+
+
+def read_run(path: str):
+    """Yields the decoded (but not yet converted) rows of a spilled run."""
+    with open(path, "rb") as fle:
+        while True:
+            try:
+                yield marshal.load(fle)
+            except EOFError:
+                return
+
+
+def sort_annotations(
+    rows, buffer_mb: float = SORT_BUFFER_MB, tmpdir: str | None = None
+):
+    """Yields `(record, variant, extra)` annotation rows sorted by (CHROM, POS).
+
+    Rows are buffered as marshal-encoded bytes until the buffer reaches `buffer_mb`,
+    then sorted and spilled as a run to a temporary file. The runs are k-way merged
+    at the end, so memory stays within the budget whatever the input size. The sort
+    is stable: rows at the same position keep their input order. Temporary files are
+    removed once the generator is exhausted or closed.
+    """
+    budget = buffer_mb * 1024 * 1024
+    buffer: list[tuple[tuple, bytes]] = []
+    size = 0
+
+    with tempfile.TemporaryDirectory(prefix="varanno-sort-", dir=tmpdir) as spill_dir:
+        runs: list[str] = []
+        for record, variant, extra in rows:
+            data = encode_row(record, variant, extra)
+            buffer.append((sort_key(variant.CHROM, variant.POS), data))
+            size += len(data) + ROW_OVERHEAD
+
+            if size >= budget:
+                runs.append(spill_run(buffer, spill_dir, len(runs)))
+                buffer, size = [], 0
+
+        if not runs:
+            buffer.sort(key=lambda item: item[0])
+            for _, data in buffer:
+                yield decode_row(marshal.loads(data))
+            return
+
+        if buffer:
+            runs.append(spill_run(buffer, spill_dir, len(runs)))
+            buffer.clear()
+
+        log.info(f"Merging {len(runs)} sorted runs")
+        merged = heapq.merge(
+            *(read_run(path) for path in runs),
+            key=lambda row: sort_key(row[1][0], row[1][1]),
+        )
+        for row in merged:
+            yield decode_row(row)
+
+
+def spill_run(buffer: list[tuple], spill_dir: str, run_no: int) -> str:
+    """Sorts the buffered rows and writes them to a run file, returning its path."""
+    buffer.sort(key=lambda item: item[0])
+    path = os.path.join(spill_dir, f"run_{run_no}.bin")
+    with open(path, "wb") as fle:
+        for _, data in buffer:
+            fle.write(data)
+    log.info(f"Spilled {len(buffer)} sorted rows -> {path}")
+    return path
@@ -0,0 +1,171 @@
+import logging
+from dataclasses import dataclass
+from .parse import parse_format_sample
+from .record import Record
+
+
+log = logging.getLogger(__name__)
+
+FIELD_SECTIONS = ("INFO", "FORMAT")
+
+# Python types of the VCF header `Type` declarations
+FIELD_TYPES = {
+    "Integer": int,
+    "Float": float,
+    "Flag": bool,
+    "Character": str,
+    "String": str,
+}
+
+# SQLite column types of single-valued fields (multi-valued fields are stored as TEXT)
+SQL_TYPES = {"Integer": "INTEGER", "Float": "REAL", "Flag": "INTEGER"}
+
+MISSING = "."
+MISSING_VALUES = (None, "", MISSING)
+
+
+class FieldError(ValueError):
+    """Raised when an extra field isn't declared in the VCF header."""
+
+
+@dataclass(frozen=True, slots=True)
+class FieldSpec:
+    """An extra INFO or FORMAT field, typed by its `##INFO`/`##FORMAT` header declaration.
+
+    Fields declared `Number=1` (or flags) are scalars, others (`A`, `R`, `G`, `.` or
+    more than one) are tuples of values. Missing values (`.`) are None.
+    """
+
+    section: str
+    key: str
+    number: str
+    type: str
+
+    def __str__(self):
+        return f"{self.section}.{self.key}"
+
+    @property
+    def column(self) -> str:
+        return f"{self.section}_{self.key}"
+
+    @property
+    def is_scalar(self) -> bool:
+        return self.type == "Flag" or self.number == "1"
+
+    @property
+    def sql_type(self) -> str:
+        return SQL_TYPES.get(self.type, "TEXT") if self.is_scalar else "TEXT"
+
+    def converter(self):
+        """Compiles the function converting the field's raw string value."""
+        cast = FIELD_TYPES[self.type]
+
+        if self.type == "Flag":
+            return lambda value: value is not None
+
+        if self.is_scalar:
+            return lambda value: None if value in MISSING_VALUES else cast(value)
+
+        def convert_values(value):
+            if value in MISSING_VALUES:
+                return None
+            return tuple(
+                None if val == MISSING else cast(val) for val in value.split(",")
+            )
+
+        return convert_values
+
+
+def parse_field(field: str, metadata: dict) -> FieldSpec:
+    """Parses an `INFO.<key>` or `FORMAT.<key>` field name, e.g. `INFO.QD` or `FORMAT.GQ`."""
+    section, _, key = field.partition(".")
+    if section not in FIELD_SECTIONS or not key:
+        raise FieldError(
+            f"Invalid field {field!r}, expected INFO.<key> or FORMAT.<key>"
+        )
+
+    for decl in metadata.get(section, []):
+        if decl.get("id") == key:
+            return FieldSpec(
+                section,
+                key,
+                decl.get("number") or MISSING,
+                decl.get("type") or "String",
+            )
+
+    raise FieldError(f"Field {field!r} is not declared in the VCF header")
+
+
+class FieldExtractor:
+    """Extracts typed extra INFO/FORMAT columns from records.
+
+    Built once per run from the header declarations, so each value is converted by
+    its declared type rather than by guessing per record. FORMAT values are taken
+    from the first sample. Values which don't match their declared type are logged
+    and set to None.
+    """
+
+    def __init__(self, specs: list[FieldSpec]):
+        self.specs = specs
+        self._info = [
+            (spec.column, spec.key, spec.converter())
+            for spec in specs
+            if spec.section == "INFO"
+        ]
+        self._format = [
+            (spec.column, spec.key, spec.converter())
+            for spec in specs
+            if spec.section == "FORMAT"
+        ]
+
+    @classmethod
+    def from_metadata(cls, fields: list[str], metadata: dict) -> "FieldExtractor":
+        specs = [parse_field(field, metadata) for field in dict.fromkeys(fields)]
+        log.info(f"Extracting extra fields: {', '.join(str(spec) for spec in specs)}")
+        return cls(specs)
+
+    @property
+    def columns(self) -> list[str]:
+        return [spec.column for spec in self.specs]
+
+    @property
+    def sql_types(self) -> dict[str, str]:
+        return {spec.column: spec.sql_type for spec in self.specs}
+
+    def extract(self, records: list[Record]) -> list[dict]:
+        """Returns the typed extra field values of each record."""
+        rows = []
+        for rec in records:
+            row = {}
+            if self._info:
+                info = dict(item.partition("=")[::2] for item in rec.INFO.split(";"))
+                for column, key, convert in self._info:
+                    row[column] = self._convert(rec, column, convert, info.get(key))
+
+            if self._format:
+                sample = (
+                    parse_format_sample(rec.FORMAT, rec.SAMPLE)
+                    if rec.FORMAT and rec.SAMPLE
+                    else {}
+                )
+                for column, key, convert in self._format:
+                    row[column] = self._convert(rec, column, convert, sample.get(key))
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def _convert(record: Record, column: str, convert, value):
+        try:
+            return convert(value)
+        except ValueError:
+            log.warning(
+                f"Invalid {column} value for record (pos: {record.POS}): {value!r}"
+            )
+            return None
+
+
+def format_value(value):
+    """Formats a typed value for text output (tuples as VCF-style comma-separated lists)."""
+    if isinstance(value, tuple):
+        return ",".join(MISSING if val is None else str(val) for val in value)
+    return value
@@ -1,4 +1,5 @@
 import os
+import gzip
 import json
 
 
@@ -21,3 +22,31 @@ def write_logs(messages: list, outfile: str):
 
     with open(outfile, "wt") as fle:
         fle.writelines(messages)
+
+
+def read_manifest(manifest: str) -> list[str]:
+    """Reads a list of input files, one per line. Blank lines and # comments are skipped."""
+    with open(manifest, "r") as fle:
+        lines = (line.strip() for line in fle)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def open_text(path: str):
+    """Opens a text file for reading, decompressing it if it ends in .gz."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+def read_bed(path: str):
+    """Yields `(chrom, start, end, name)` intervals from a BED file (name is None if absent).
+
+    Starts are shifted to 1-based inclusive positions, like VCF positions.
+    """
+    with open_text(path) as fle:
+        for line in fle:
+            if line.startswith(("#", "track", "browser")) or not line.strip():
+                continue
+            cols = line.rstrip("\n").split("\t")
+            name = cols[3] if len(cols) > 3 else None
+            yield cols[0], int(cols[1]) + 1, int(cols[2]), name
@@ -0,0 +1,95 @@
+import re
+import operator
+from dataclasses import dataclass
+from typing import Sequence
+from .allele import parse_genotype
+from .parse import parse_record_info, parse_format_sample
+from .record import Record
+
+
+FILTER_EXPR = (
+    r"^\s*(?P<field>CHROM|FILTER|QUAL|GT|INFO\.\w+)\s*"
+    r"(?P<op>==|!=|>=|<=|>|<|\bin\b)\s*"
+    r"(?P<value>.+?)\s*$"
+)
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+class FilterExpressionError(ValueError):
+    pass
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return value
+
+
+@dataclass(slots=True, frozen=True)
+class RecordFilter:
+    """A single filter on a record field, e.g. `QUAL>=30` or `INFO.TC>100`.
+
+    Fields:
+    - CHROM, FILTER, QUAL: the record columns
+    - INFO.<key>: the value of an INFO key
+    - GT: the parsed genotype (homozygous_ref, heterozygous, homozygous_alt or unknown)
+
+    Values are compared as numbers when both sides are numeric. `in` takes a comma
+    separated list (e.g. `CHROM in 1,2,X`). Records missing the field never match.
+    """
+
+    field: str
+    op: str
+    value: str
+
+    def __str__(self):
+        return f"{self.field}{self.op}{self.value}"
+
+    def field_value(self, record: Record) -> str | None:
+        if self.field == "GT":
+            sample = (
+                parse_format_sample(record.FORMAT, record.SAMPLE)
+                if record.FORMAT and record.SAMPLE
+                else {}
+            )
+            gt = sample.get("GT")
+            return (parse_genotype(gt) if gt else None) or "unknown"
+
+        if self.field.startswith("INFO."):
+            return parse_record_info(record.INFO).get(self.field[5:])
+
+        return getattr(record, self.field)
+
+    def __call__(self, record: Record) -> bool:
+        value = self.field_value(record)
+        if value is None or value == ".":
+            return False
+
+        if self.op == "in":
+            return value in (val.strip() for val in self.value.split(","))
+
+        left, right = _as_number(value), _as_number(self.value)
+        if type(left) is not type(right):
+            left, right = str(value), self.value
+
+        return OPERATORS[self.op](left, right)
+
+
+def parse_filter(expr: str) -> RecordFilter:
+    """Parses a filter expression like `FILTER==PASS` into a `RecordFilter`."""
+    if m := re.match(FILTER_EXPR, expr):
+        return RecordFilter(m.group("field"), m.group("op"), m.group("value"))
+    raise FilterExpressionError(f"Invalid filter expression: {expr}")
+
+
+def parse_filters(exprs: Sequence[str | RecordFilter] | None) -> list[RecordFilter]:
+    return [parse_filter(e) if isinstance(e, str) else e for e in exprs or []]
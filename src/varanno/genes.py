@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import logging
+import numpy as np
+from collections import defaultdict
+from .fileio import open_text, read_bed
+
+
+log = logging.getLogger(__name__)
+
+GTF_GENE_ID = re.compile(r'gene_id "([^"]+)"')
+
+INDEX_ARRAYS = ("starts", "ends", "max_ends", "gene_ids")
+
+
+def normalize_chrom(chrom: str) -> str:
+    """Chromosome names without a "chr" prefix, so UCSC and Ensembl names match."""
+    return chrom.removeprefix("chr")
+
+
+def read_gene_intervals(path: str):
+    """Yields `(chrom, start, end, gene_id)` gene intervals from a GTF or BED file.
+
+    Intervals are 1-based and inclusive, like VCF positions (BED starts are shifted).
+    GTF files contribute their "gene" features, BED files every row, named by the
+    4th column.
+    """
+    if re.search(r"\.bed(\.gz)?$", str(path)):
+        for chrom, start, end, name in read_bed(path):
+            yield (
+                normalize_chrom(chrom),
+                start,
+                end,
+                name or f"{chrom}:{start - 1}-{end}",
+            )
+        return
+
+    with open_text(path) as fle:
+        for line in fle:
+            if line.startswith("#") or not line.strip():
+                continue
+            cols = line.rstrip("\n").split("\t")
+            if cols[2] == "gene" and (m := GTF_GENE_ID.search(cols[8])):
+                yield normalize_chrom(cols[0]), int(cols[3]), int(cols[4]), m.group(1)
+
+
+class GeneIndex:
+    """Gene intervals per chromosome as sorted numpy arrays, for offline gene_id lookup.
+
+    Genes are sorted by start, with a running maximum of the end positions so that an
+    overlap lookup is a binary search plus a short walk back over nested genes.
+    Arrays for all chromosomes are concatenated, and `chroms` maps each chromosome
+    to its `(lo, hi)` slice. Saved indexes are loaded memory-mapped.
+    """
+
+    def __init__(
+        self,
+        chroms: dict[str, tuple[int, int]],
+        starts: np.ndarray,
+        ends: np.ndarray,
+        max_ends: np.ndarray,
+        gene_ids: np.ndarray,
+    ):
+        self.chroms = chroms
+        self.starts = starts
+        self.ends = ends
+        self.max_ends = max_ends
+        self.gene_ids = gene_ids
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_intervals(cls, intervals) -> "GeneIndex":
+        by_chrom = defaultdict(list)
+        for chrom, start, end, gene_id in intervals:
+            by_chrom[chrom].append((start, end, gene_id))
+
+        chroms: dict[str, tuple[int, int]] = {}
+        starts: list[int] = []
+        ends: list[np.ndarray] = []
+        max_ends: list[np.ndarray] = []
+        gene_ids: list[str] = []
+        for chrom, genes in by_chrom.items():
+            genes.sort()
+            chrom_ends = np.array([end for _, end, _ in genes], dtype=np.int64)
+            chroms[chrom] = (len(gene_ids), len(gene_ids) + len(genes))
+            starts.extend(start for start, _, _ in genes)
+            ends.append(chrom_ends)
+            max_ends.append(np.maximum.accumulate(chrom_ends))
+            gene_ids.extend(gene_id for _, _, gene_id in genes)
+
+        empty = np.empty(0, dtype=np.int64)
+        return cls(
+            chroms,
+            np.array(starts, dtype=np.int64),
+            np.concatenate(ends) if ends else empty,
+            np.concatenate(max_ends) if max_ends else empty,
+            np.array(gene_ids, dtype=str),
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "GeneIndex":
+        """Builds an index from a GTF or BED gene annotation file."""
+        index = cls.from_intervals(read_gene_intervals(path))
+        log.info(
+            f"Indexed {len(index)} genes on {len(index.chroms)} chromosomes: {path}"
+        )
+        return index
+
+    def save(self, path: str):
+        """Saves the index to a directory of .npy arrays."""
+        os.makedirs(path, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "chroms.json"), "w") as fle:
+            json.dump(self.chroms, fle)
+
+    @classmethod
+    def load(cls, path: str) -> "GeneIndex":
+        """Loads a saved index, memory-mapping its arrays."""
+        with open(os.path.join(path, "chroms.json"), "r") as fle:
+            chroms = {chrom: tuple(bounds) for chrom, bounds in json.load(fle).items()}
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in INDEX_ARRAYS
+        }
+        return cls(chroms, **arrays)
+
+    def _walk_back(self, idx: int, lo: int, pos: int) -> str | None:
+        while idx >= lo and self.max_ends[idx] >= pos:
+            if self.ends[idx] >= pos:
+                return str(self.gene_ids[idx])
+            idx -= 1
+        return None
+
+    def lookup(self, chrom: str, pos: int) -> str | None:
+        """The gene overlapping `chrom:pos` with the closest start (None if intergenic)."""
+        if (bounds := self.chroms.get(normalize_chrom(chrom))) is None:
+            return None
+        lo, hi = bounds
+        idx = lo + int(np.searchsorted(self.starts[lo:hi], pos, side="right")) - 1
+        return self._walk_back(idx, lo, pos)
+
+    def lookup_many(self, chroms: list[str], positions) -> list[str | None]:
+        """Vectorized `lookup` over many records, one binary search per chromosome."""
+        chrom_names = np.array([normalize_chrom(chrom) for chrom in chroms], dtype=str)
+        positions = np.asarray(positions, dtype=np.int64)
+        gene_ids = np.full(len(positions), None, dtype=object)
+
+        for chrom in np.unique(chrom_names):
+            if (bounds := self.chroms.get(str(chrom))) is None:
+                continue
+            lo, hi = bounds
+            rows = np.flatnonzero(chrom_names == chrom)
+            pos = positions[rows]
+            idx = lo + np.searchsorted(self.starts[lo:hi], pos, side="right") - 1
+            valid = idx >= lo
+            idx = np.where(valid, idx, lo)
+
+            # Most positions overlap the gene starting closest before them (or none)
+            hits = valid & (self.ends[idx] >= pos)
+            gene_ids[rows[hits]] = self.gene_ids[idx[hits]]
+
+            # The others may be within an earlier gene which spans past a nested one
+            nested = valid & ~hits & (self.max_ends[idx] >= pos)
+            for row, i, p in zip(rows[nested], idx[nested], pos[nested]):
+                gene_ids[row] = self._walk_back(int(i) - 1, lo, int(p))
+
+        return gene_ids.tolist()
+
+
+def load_gene_index(path: str) -> GeneIndex:
+    """Loads a saved index directory, or builds one from a GTF or BED file."""
+    if os.path.isdir(path):
+        return GeneIndex.load(path)
+    return GeneIndex.from_file(path)
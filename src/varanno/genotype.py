@@ -0,0 +1,180 @@
+import re
+import numpy as np
+from dataclasses import dataclass
+from .record import Record
+
+
+GT_MISSING = -1  # allele call is "."
+GT_PAD = -2  # sample has fewer alleles than the batch ploidy (e.g. haploid calls)
+
+# Allele indexes are stored as int16, larger (or negative) indexes are malformed
+GT_DTYPE = np.int16
+GT_MAX_ALLELE = np.iinfo(GT_DTYPE).max
+
+GENOTYPE_CLASSES = ("unknown", "homozygous_ref", "heterozygous", "homozygous_alt")
+
+GT_SEP = re.compile(r"[/|]")
+
+
+def decode_gt(gtstr: str) -> tuple[tuple[int, ...], bool]:
+    """Decodes a GT string into allele indexes and a phased flag.
+
+    E.g. `"0/1"` -> `((0, 1), False)`, `"1|2"` -> `((1, 2), True)`, `"./."` -> `((-1, -1), False)`.
+    Malformed values, including allele indexes out of the `GT_DTYPE` range, are
+    treated as a missing call.
+    """
+    alleles = []
+    for allele in GT_SEP.split(gtstr):
+        try:
+            index = int(allele)
+        except ValueError:
+            index = GT_MISSING
+        alleles.append(index if 0 <= index <= GT_MAX_ALLELE else GT_MISSING)
+    return tuple(alleles), "|" in gtstr
+
+
+def decode_counts(value: str) -> tuple[float, ...]:
+    """Decodes a comma-separated per-allele count (e.g. NV=`"208,95"`). Missing values are NaN."""
+    counts = []
+    for count in value.split(","):
+        try:
+            counts.append(float(count))
+        except ValueError:
+            counts.append(np.nan)
+    return tuple(counts)
+
+
+def _decode_column(values: list[str], decoder, fill, dtype):
+    """Decodes a flat list of string values into a 2D array (len(values), width).
+
+    Each distinct string is decoded only once: the (small) table of unique values
+    is decoded in python, then broadcast back to every cell with a single numpy take.
+    """
+    uniq, inverse = np.unique(np.array(values, dtype=str), return_inverse=True)
+    decoded = [decoder(val) for val in uniq]
+    width = max((len(d) for d in decoded), default=1)
+
+    table = np.full((len(uniq), width), fill, dtype=dtype)
+    for i, row in enumerate(decoded):
+        table[i, : len(row)] = row
+
+    return table[inverse.reshape(-1)]
+
+
+@dataclass(slots=True)
+class GenotypeBatch:
+    """Per-sample FORMAT values for a batch of records, decoded into numpy arrays.
+
+    - `gt`: allele indexes, shape (n_records, n_samples, ploidy), int16
+    - `phased`: phased flag, shape (n_records, n_samples), bool
+    - `nr`/`nv`: per-allele read counts, shape (n_records, n_samples, n_alleles), float32
+    """
+
+    records: list[Record]
+    samples: tuple[str, ...]
+    gt: np.ndarray
+    phased: np.ndarray
+    nr: np.ndarray
+    nv: np.ndarray
+
+    def genotype_codes(self) -> np.ndarray:
+        """Classifies each call as an index into `GENOTYPE_CLASSES`, shape (n_records, n_samples)."""
+        called = np.where(self.gt == GT_PAD, 0, self.gt)
+        alleles = np.where(self.gt == GT_PAD, self.gt[..., :1], self.gt)
+
+        missing = (called == GT_MISSING).any(axis=-1)
+        hom_ref = (alleles == 0).all(axis=-1)
+        hom = (alleles == alleles[..., :1]).all(axis=-1)
+
+        codes = np.full(self.phased.shape, 2, dtype=np.int8)
+        codes[hom] = 3
+        codes[hom_ref] = 1
+        codes[missing] = 0
+        return codes
+
+    def long_rows(self):
+        """Yields one row per (record, sample) pair."""
+        codes = self.genotype_codes()
+        for i, record in enumerate(self.records):
+            for j, sample in enumerate(self.samples):
+                yield {
+                    "CHROM": record.CHROM,
+                    "POS": record.POS,
+                    "ID": record.ID,
+                    "REF": record.REF,
+                    "ALT": record.ALT,
+                    "sample": sample,
+                    "GT": format_gt(self.gt[i, j], self.phased[i, j]),
+                    "genotype": GENOTYPE_CLASSES[codes[i, j]],
+                    "NR": format_counts(self.nr[i, j]),
+                    "NV": format_counts(self.nv[i, j]),
+                }
+
+
+GENOTYPE_FIELDS = (
+    "CHROM",
+    "POS",
+    "ID",
+    "REF",
+    "ALT",
+    "sample",
+    "GT",
+    "genotype",
+    "NR",
+    "NV",
+)
+
+
+def format_gt(alleles: np.ndarray, phased: bool) -> str:
+    sep = "|" if phased else "/"
+    return sep.join("." if a == GT_MISSING else str(a) for a in alleles if a != GT_PAD)
+
+
+def format_counts(counts: np.ndarray) -> str:
+    return ",".join(str(int(c)) for c in counts if not np.isnan(c))
+
+
+def decode_genotypes(records: list[Record], samples: tuple[str, ...]) -> GenotypeBatch:
+    """Decodes the GT, NR and NV values of every sample column for a batch of records.
+
+    Sample values are looked up by each record's own FORMAT keys, and samples which
+    omit trailing FORMAT fields are treated as missing.
+    """
+    gt_values: list[str] = []
+    nr_values: list[str] = []
+    nv_values: list[str] = []
+    for record in records:
+        keys = record.FORMAT.split(":") if record.FORMAT else []
+        idx = {
+            key: keys.index(key) if key in keys else None for key in ("GT", "NR", "NV")
+        }
+
+        for sample in record.samples:
+            fields = sample.split(":")
+            for key, values in (
+                ("GT", gt_values),
+                ("NR", nr_values),
+                ("NV", nv_values),
+            ):
+                pos = idx[key]
+                values.append(
+                    fields[pos] if pos is not None and pos < len(fields) else "."
+                )
+
+    n_rec, n_smp = len(records), len(samples)
+    if len(gt_values) != n_rec * n_smp:
+        raise ValueError("Record sample columns do not match the header samples")
+
+    gt = _decode_column(gt_values, lambda v: decode_gt(v)[0], GT_PAD, GT_DTYPE)
+    phased = np.array(["|" in val for val in gt_values], dtype=np.bool_)
+    nr = _decode_column(nr_values, decode_counts, np.nan, np.float32)
+    nv = _decode_column(nv_values, decode_counts, np.nan, np.float32)
+
+    return GenotypeBatch(
+        records=records,
+        samples=samples,
+        gt=gt.reshape(n_rec, n_smp, -1),
+        phased=phased.reshape(n_rec, n_smp),
+        nr=nr.reshape(n_rec, n_smp, -1),
+        nv=nv.reshape(n_rec, n_smp, -1),
+    )
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import logging
+from itertools import islice
+from dataclasses import dataclass, asdict
+from .record import Record
+
+
+log = logging.getLogger(__name__)
+
+# Alleles which translate into valid HGVS notations
+HGVS_ALLELE = re.compile(r"^[ACGTN]+$", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class QueryPlan:
+    """The VEP queries a run would make, counted without any network access."""
+
+    query_mode: str
+    batch_size: int
+    num_records: int = 0
+    num_off_target: int = 0
+    num_unique_notations: int = 0
+    num_cached_notations: int = 0
+    num_invalid_notations: int = 0
+    num_multi_allelic: int = 0
+    num_batches: int = 0
+    num_query_batches: int = 0
+    mean_batch_seconds: float | None = None
+    estimated_seconds: float | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def notation_problem(record: Record) -> str | None:
+    """Why the record's HGVS notation can't be annotated by VEP: "multi_allelic", "invalid" or None."""
+    if "," in record.ALT:
+        return "multi_allelic"
+    if not (HGVS_ALLELE.match(record.REF) and HGVS_ALLELE.match(record.ALT)):
+        return "invalid"
+    return None
+
+
+def plan_queries(
+    records,
+    batch_size: int = 50,
+    cache=None,
+    query_mode: str = "hgvs",
+    batch_seconds: float | None = None,
+) -> QueryPlan:
+    """Counts the records, notations and VEP batches of a run, consuming `records` once.
+
+    Records are batched as the run batches them, and the query batches are the
+    batches which would send a VEP request. Records tagged off-target are batched
+    with the others but aren't queried, so a batch of off-target records sends no
+    request and their notations aren't counted. With a `VEPResultCache`, a batch
+    only sends a request for the notations which neither the cache nor an earlier
+    batch holds. `batch_seconds` (the mean latency of a VEP batch, see
+    `read_batch_latency`) gives the estimated wall time of the queries.
+    """
+    plan = QueryPlan(query_mode, batch_size)
+    notations: set[str] = set()
+    queried: set[str] = set()
+
+    records = iter(records)
+    for batch in iter(lambda: list(islice(records, batch_size)), []):
+        plan.num_batches += 1
+        batch_notations = set()
+        for rec in batch:
+            plan.num_records += 1
+            if rec.is_off_target:
+                plan.num_off_target += 1
+                continue
+            batch_notations.add(rec.vcf_variant if query_mode == "region" else rec.hgvs)
+            if problem := notation_problem(rec):
+                if problem == "multi_allelic":
+                    plan.num_multi_allelic += 1
+                else:
+                    plan.num_invalid_notations += 1
+
+        notations |= batch_notations
+        if cache is not None:
+            batch_notations = {
+                notation
+                for notation in batch_notations
+                if notation not in queried and notation not in cache
+            }
+            queried |= batch_notations
+        if batch_notations and query_mode != "genes":
+            plan.num_query_batches += 1
+
+    plan.num_unique_notations = len(notations)
+    if query_mode == "genes":
+        return plan
+
+    if cache is not None:
+        plan.num_cached_notations = sum(notation in cache for notation in notations)
+
+    if batch_seconds is not None:
+        plan.mean_batch_seconds = round(batch_seconds, 3)
+        plan.estimated_seconds = round(plan.num_query_batches * batch_seconds, 1)
+    return plan
+
+
+@dataclass(slots=True)
+class BatchLatency:
+    """Running count, total and maximum of a run's VEP batch latencies, in seconds.
+
+    Only the summary is kept, so memory stays constant however many batches a run has.
+    """
+
+    num_batches: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def add(self, seconds: float):
+        self.num_batches += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def to_dict(self, batch_size: int) -> dict:
+        """Summarizes the recorded latencies, for the metadata JSON."""
+        recorded = self.num_batches > 0
+        return {
+            "batch_size": batch_size,
+            "num_batches": self.num_batches,
+            "mean_batch_seconds": (
+                round(self.total_seconds / self.num_batches, 3) if recorded else None
+            ),
+            "max_batch_seconds": round(self.max_seconds, 3) if recorded else None,
+        }
+
+
+def read_batch_latency(path: str, batch_size: int) -> float | None:
+    """The mean VEP batch latency recorded by a previous run, scaled to `batch_size`.
+
+    `path` is the run's metadata.json or output directory. VEP latency grows with the
+    batch size, so a latency recorded at another batch size is scaled linearly.
+    Returns None if the run has no recorded latency.
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, "metadata.json")
+    if not os.path.exists(path):
+        log.warning(f"No metadata with recorded VEP latency at {path}")
+        return None
+
+    with open(path, "r") as fle:
+        latency = json.load(fle).get("run", {}).get("vep_latency") or {}
+
+    if latency.get("mean_batch_seconds") is None:
+        log.warning(f"No VEP latency recorded in {path}")
+        return None
+    return latency["mean_batch_seconds"] * batch_size / latency["batch_size"]
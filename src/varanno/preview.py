@@ -0,0 +1,94 @@
+import random
+import logging
+from dataclasses import dataclass, field
+from .record import Record
+from .summary import AnnotationSummary
+
+
+log = logging.getLogger(__name__)
+
+PREVIEW_STRATA = ("CHROM", "FILTER")
+
+
+@dataclass(slots=True)
+class Stratum:
+    """A reservoir sample of the records sharing a CHROM or FILTER value (or of all records)."""
+
+    num_records: int = 0
+    records: list[Record] = field(default_factory=list)
+    summary: AnnotationSummary = field(default_factory=AnnotationSummary)
+
+    @property
+    def weight(self) -> float:
+        """Number of records each sampled record stands for."""
+        return self.num_records / len(self.records) if self.records else 0.0
+
+
+def stratum_key(record: Record, stratify: str | None = None) -> str:
+    return getattr(record, stratify) if stratify else "all"
+
+
+def reservoir_sample(
+    records, size: int, stratify: str | None = None, seed: int | None = None
+) -> dict[str, Stratum]:
+    """Samples up to `size` records uniformly in a single pass (per stratum if `stratify` is set).
+
+    Returns the strata by CHROM or FILTER value (a single "all" stratum if not
+    stratified), each with its sampled records in file order.
+    """
+    if stratify is not None and stratify not in PREVIEW_STRATA:
+        raise ValueError(
+            f"Can't stratify preview by {stratify}, expected one of {PREVIEW_STRATA}"
+        )
+
+    rng = random.Random(seed)
+    strata: dict[str, Stratum] = {}
+    for record in records:
+        key = stratum_key(record, stratify)
+        if (stratum := strata.get(key)) is None:
+            stratum = strata[key] = Stratum()
+
+        stratum.num_records += 1
+        if len(stratum.records) < size:
+            stratum.records.append(record)
+        elif (idx := rng.randrange(stratum.num_records)) < size:
+            stratum.records[idx] = record
+
+    for stratum in strata.values():
+        stratum.records.sort(key=lambda rec: rec.line_no or 0)
+    return strata
+
+
+def stratum_batches(strata: dict[str, Stratum], batch_size: int = 50):
+    """Yields batches of the sampled records, stratum by stratum."""
+    for key, stratum in strata.items():
+        log.info(
+            f"Annotating preview stratum {key}: {len(stratum.records)}/{stratum.num_records} records"
+        )
+        for i in range(0, len(stratum.records), batch_size):
+            yield stratum.records[i : i + batch_size]
+
+
+def extrapolated_summary(strata: dict[str, Stratum]) -> AnnotationSummary:
+    """Estimates the summary of all records by weighting each stratum's sample summary.
+
+    The annotations of each stratum's sampled records must have been added to its summary.
+    """
+    summary = AnnotationSummary()
+    for stratum in strata.values():
+        summary.merge(stratum.summary.scaled(stratum.weight))
+    return summary
+
+
+def preview_metadata(strata: dict[str, Stratum]) -> dict:
+    return {
+        "num_records": sum(stratum.num_records for stratum in strata.values()),
+        "num_sampled": sum(len(stratum.records) for stratum in strata.values()),
+        "strata": {
+            key: {
+                "num_records": stratum.num_records,
+                "num_sampled": len(stratum.records),
+            }
+            for key, stratum in strata.items()
+        },
+    }
@@ -1,13 +1,17 @@
 import logging
+from functools import partial
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Callable, Sequence
 from .allele import variant_type, parse_genotype
 from .utils import cast_float
 from .parse import parse_record_info, parse_format_sample
 from .vep import (
     HGVSString,
     batch_vep_hgvs,
+    batch_vep_region,
+    bisect_vep_hgvs,
     hgvs_string,
+    vcf_variant_string,
     vep_api_hgvs_get,
     find_vep_gene_id,
     find_vep_maf,
@@ -19,6 +23,10 @@ from .vep import (
 
 log = logging.getLogger(__name__)
 
+# FILTER tag of records outside the target regions, which are not queried on VEP
+OFF_TARGET = "off_target"
+OFF_TARGET_ERROR = "Outside target regions"
+
 
 @dataclass(slots=True)
 class Record:
@@ -32,13 +40,50 @@ class Record:
     INFO: str
     FORMAT: str | None = None
     SAMPLE: str | None = None
+    extra_samples: tuple[str, ...] = ()
 
     line_no: int | None = None
+    # Original data line, only kept when the reader is asked to (for annotated VCF output)
+    line: str | None = field(default=None, repr=False, compare=False)
     hgvs: HGVSString = field(init=False)
 
     def __post_init__(self):
         self.hgvs = hgvs_string(self.CHROM, self.POS, self.REF, self.ALT)
 
+    @classmethod
+    def from_row(cls, row: Sequence[str]) -> "Record":
+        """Builds a record from the columns of a data line (samples after the first are extra)."""
+        chrom, pos, id_, ref, alt, qual, filt, info = row[:8]
+        return cls(
+            chrom,
+            pos,
+            id_,
+            ref,
+            alt,
+            qual,
+            filt,
+            info,
+            FORMAT=row[8] if len(row) > 8 else None,
+            SAMPLE=row[9] if len(row) > 9 else None,
+            extra_samples=tuple(row[10:]),
+        )
+
+    @property
+    def samples(self) -> tuple[str, ...]:
+        """All sample columns of the record (SAMPLE followed by any extra samples)."""
+        if self.SAMPLE is None:
+            return ()
+        return (self.SAMPLE, *self.extra_samples)
+
+    @property
+    def is_off_target(self) -> bool:
+        return OFF_TARGET in self.FILTER.split(";")
+
+    @property
+    def vcf_variant(self) -> str:
+        """The variant as a VCF-style string, for the VEP region endpoint."""
+        return vcf_variant_string(self.CHROM, self.POS, self.ID, self.REF, self.ALT)
+
 
 def pct_reads_supporting_variant(
     n_reads_supporting_variant: float | Any, total_coverage: float | Any
@@ -51,7 +96,7 @@ def pct_reads_supporting_variant(
         tot_reads = float(total_coverage)
         return round((var_reads / tot_reads) * 100, 4)
 
-    except (ValueError, ZeroDivisionError):
+    except (ValueError, TypeError, ZeroDivisionError):
         return None
 
 
@@ -72,10 +117,33 @@ class VariantAnnotation:
     num_reads_supporting_variant: float | None
     pct_reads_supporting_variant: float | None
     genotype: str | None
+    vep_error: str | None = None
+
+
+def vep_annotation_fields(vep_data: dict, alt: str) -> dict:
+    """Extracts the VEP-derived `VariantAnnotation` fields from a VEP API result."""
+    # type of variation
+    allele_string = find_vep_allele_string(vep_data)
+
+    return {
+        # get gene of variant
+        "gene_id": find_vep_gene_id(vep_data),
+        "allele_string": allele_string,
+        "variant_type": variant_type(allele_string) if allele_string else None,
+        # Variant effect
+        "variant_effect": find_vep_variant_effect(vep_data),
+        # Minor allele frequency
+        "minor_allele_frequency": find_vep_maf(vep_data, alt),
+        # Reason the VEP lookup failed (e.g. notation rejected or missing from the response)
+        "vep_error": vep_data.get("error"),
+    }
+
 
+def annotation_factory(record: Record, vep_data: dict | None = None, gene_index=None):
+    """Generate annotations for a given variant record.
 
-def annotation_factory(record: Record, vep_data: dict | None = None):
-    """Generate annotations for a given variant record."""
+    If a `GeneIndex` is given, it assigns the gene_id of records without one from VEP.
+    """
     # log.info(f"Annotating record: {record}")
 
     info = parse_record_info(record.INFO)
@@ -107,18 +175,9 @@ def annotation_factory(record: Record, vep_data: dict | None = None):
     if vep_data is None:
         vep_data = vep_api_hgvs_get(record.hgvs)
 
-    # get gene of variant
-    gene_id = find_vep_gene_id(vep_data)
-
-    # type of variation
-    allele_string = find_vep_allele_string(vep_data)
-    vtype = variant_type(allele_string) if allele_string else None
-
-    # Variant effect
-    effect = find_vep_variant_effect(vep_data)
-
-    # Minor allele frequency
-    maf = find_vep_maf(vep_data, record.ALT)
+    vep_fields = vep_annotation_fields(vep_data, record.ALT)
+    if vep_fields["gene_id"] is None and gene_index is not None:
+        vep_fields["gene_id"] = gene_index.lookup(record.CHROM, int(record.POS))
 
     return VariantAnnotation(
         CHROM=record.CHROM,
@@ -127,27 +186,40 @@ def annotation_factory(record: Record, vep_data: dict | None = None):
         REF=record.REF,
         ALT=record.ALT,
         hgvs=record.hgvs,
-        gene_id=gene_id,
-        allele_string=allele_string,
-        variant_type=vtype,
-        variant_effect=effect,
-        minor_allele_frequency=maf,
         depth_of_sequence_coverage=total_coverage,
         num_reads_supporting_variant=num_var_reads,
         pct_reads_supporting_variant=pct_supporting,
         genotype=genotype,
+        **vep_fields,
     )
 
 
-def annotate_batch(records: list[Record]):
-    """Generates annotations for a batch of VCF records.
+def query_vep_hgvs(
+    hgvs_strings: list[HGVSString], timeout: float | None = None
+) -> list[dict]:
+    """Fetches VEP data for a batch of HGVS notations, one result per notation."""
+    return query_vep(hgvs_strings, batch_vep_hgvs, timeout)
+
+
+def query_vep_region(variants: list[str], timeout: float | None = None) -> list[dict]:
+    """Fetches VEP data for a batch of VCF-style variant strings, one result per variant."""
+    return query_vep(variants, batch_vep_region, timeout)
+
+
+def query_vep(
+    hgvs_strings: list[str], query, timeout: float | None = None
+) -> list[dict]:
+    """Fetches VEP data for a batch of notations with `query`, one result per notation.
 
     Realigns outputs to appropriate inputs if the VEP API response
     contains fewer items than requested (it appears to filter out
-    queries it can't process).
+    queries it can't process). Batches rejected by the API are bisected
+    so that only the offending records are emitted without VEP data.
+    `timeout` (seconds) bounds each VEP request.
     """
-    hgvs_strings = [rec.hgvs for rec in records]
-    hgvs_results = batch_vep_hgvs(hgvs_strings)
+    if timeout is not None:
+        query = partial(query, timeout=timeout)
+    hgvs_results = bisect_vep_hgvs(hgvs_strings, query)
 
     if len(hgvs_results) != len(hgvs_strings):
         log.warning(
@@ -159,5 +231,69 @@ def annotate_batch(records: list[Record]):
         )
         hgvs_results = list(realign_hgvs_inputs_outputs(hgvs_results, hgvs_strings))
 
-    for record, result in zip(records, hgvs_results):
-        yield annotation_factory(record, result)
+    return hgvs_results
+
+
+QUERY_MODES = ("hgvs", "region", "genes")
+# Query modes which query VEP ("genes" needs a local gene index instead)
+VEP_QUERY_MODES = ("hgvs", "region")
+
+
+def fetch_vep_results(
+    records: list[Record], cache=None, query_mode: str = "hgvs", breaker=None
+) -> list[dict]:
+    """Fetches VEP data for a batch of VCF records, one result per record.
+
+    `query_mode` selects the VEP endpoint: "hgvs" queries HGVS notations, "region"
+    queries VCF-style variant strings built directly from the record columns, and
+    "genes" skips VEP (gene_id then comes from a local `GeneIndex` only).
+    If a `VEPResultCache` is given, only notations it hasn't seen are queried.
+    If a `CircuitBreaker` is given, failed or skipped queries are queued for a
+    later backfill instead of raising. Records tagged off-target aren't queried.
+    """
+    if query_mode == "genes":
+        return [{} for _ in records]
+
+    if any(rec.is_off_target for rec in records):
+        on_target = [rec for rec in records if not rec.is_off_target]
+        results = iter(
+            fetch_vep_results(on_target, cache, query_mode, breaker)
+            if on_target
+            else []
+        )
+        return [
+            {"error": OFF_TARGET_ERROR} if rec.is_off_target else next(results)
+            for rec in records
+        ]
+
+    # A breaker bounds each VEP request, so a hung endpoint counts as a failure
+    timeout = breaker.timeout if breaker is not None else None
+    query: Callable[[list[str]], list[dict]]
+    if query_mode == "region":
+        notations = [rec.vcf_variant for rec in records]
+        query = partial(query_vep_region, timeout=timeout)
+    else:
+        notations = [rec.hgvs for rec in records]
+        query = partial(query_vep_hgvs, timeout=timeout)
+
+    def fetch(notations):
+        if cache is None:
+            return query(notations)
+        return cache.fetch(notations, query)
+
+    if breaker is None:
+        return fetch(notations)
+    return breaker.call(notations, fetch)
+
+
+def annotate_batch(
+    records: list[Record],
+    cache=None,
+    query_mode: str = "hgvs",
+    breaker=None,
+    gene_index=None,
+):
+    """Generates annotations for a batch of VCF records."""
+    results = fetch_vep_results(records, cache, query_mode, breaker)
+    for record, result in zip(records, results):
+        yield annotation_factory(record, result, gene_index)
@@ -0,0 +1,143 @@
+import os
+import mmap
+import logging
+from dataclasses import dataclass
+from .record import Record
+from .vep import hgvs_string
+
+
+log = logging.getLogger(__name__)
+
+# Alleles which can't be normalized against the reference (symbolic, breakends, missing)
+UNNORMALIZABLE = ("<", "[", "]", "*", ".")
+
+
+@dataclass(frozen=True, slots=True)
+class FaiEntry:
+    """A `.fai` index line: sequence length, byte offset, bases and bytes per line."""
+
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+
+def read_fai(fai_file: str) -> dict[str, FaiEntry]:
+    with open(fai_file, "r") as fle:
+        entries = {}
+        for line in fle:
+            name, length, offset, line_bases, line_width = line.split("\t")[:5]
+            entries[name] = FaiEntry(
+                int(length), int(offset), int(line_bases), int(line_width)
+            )
+        return entries
+
+
+class ReferenceGenome:
+    """Random access to a FASTA reference with a `.fai` index (`samtools faidx`).
+
+    The FASTA is memory-mapped, so only the pages around the fetched positions are
+    read, never the whole genome. Chromosome names match with or without a "chr" prefix.
+    """
+
+    def __init__(self, fasta: str, fai: str | None = None):
+        self.fasta = fasta
+        self.index = read_fai(fai or f"{fasta}.fai")
+        self._file = open(fasta, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def entry(self, chrom: str) -> FaiEntry | None:
+        for name in (chrom, chrom.removeprefix("chr"), f"chr{chrom}"):
+            if name in self.index:
+                return self.index[name]
+        return None
+
+    def fetch(self, chrom: str, start: int, end: int) -> str:
+        """The uppercase reference sequence at `chrom:start-end` (1-based, inclusive).
+
+        Raises KeyError for unknown chromosomes. The range is clipped to the sequence.
+        """
+        if (entry := self.entry(chrom)) is None:
+            raise KeyError(
+                f"Chromosome {chrom} not in reference {os.path.basename(self.fasta)}"
+            )
+
+        start, end = max(start, 1) - 1, min(end, entry.length)
+        if end <= start:
+            return ""
+
+        def byte_offset(pos: int) -> int:
+            line, col = divmod(pos, entry.line_bases)
+            return entry.offset + line * entry.line_width + col
+
+        data = self._mm[byte_offset(start) : byte_offset(end - 1) + 1]
+        return data.replace(b"\n", b"").replace(b"\r", b"").decode().upper()
+
+    def normalize(
+        self, chrom: str, pos: int, ref: str, alt: str
+    ) -> tuple[int, str, str]:
+        """Left-aligns and trims a variant (`vt normalize` style), returning `(pos, ref, alt)`.
+
+        Alleles sharing a last base are trimmed on the right, then extended by the
+        preceding reference base while an allele would be empty, so indels in repeats
+        move to their leftmost position. Shared first bases are then trimmed on the
+        left (keeping at least one base). Multi-allelic ALTs are normalized jointly.
+        Variants whose REF doesn't match the reference (or on chromosomes missing
+        from it) are returned unchanged.
+        """
+        alts = alt.split(",")
+        if ref in alts or any(a.startswith(UNNORMALIZABLE) for a in (ref, *alts)):
+            return pos, ref, alt
+        if self.entry(chrom) is None:
+            return pos, ref, alt
+
+        if self.fetch(chrom, pos, pos + len(ref) - 1) != ref.upper():
+            log.warning(
+                f"REF {ref} does not match the reference at {chrom}:{pos}, not normalizing"
+            )
+            return pos, ref, alt
+
+        start = pos
+        alleles = [ref.upper(), *(a.upper() for a in alts)]
+        while True:
+            if all(alleles) and len({allele[-1] for allele in alleles}) == 1:
+                alleles = [allele[:-1] for allele in alleles]
+            elif not all(alleles) and pos > 1:
+                pos -= 1
+                base = self.fetch(chrom, pos, pos)
+                alleles = [base + allele for allele in alleles]
+            else:
+                break
+
+        if not all(alleles):
+            return start, ref, alt
+
+        while (
+            min(map(len, alleles)) > 1 and len({allele[0] for allele in alleles}) == 1
+        ):
+            alleles = [allele[1:] for allele in alleles]
+            pos += 1
+
+        return pos, alleles[0], ",".join(alleles[1:])
+
+    def normalize_record(self, record: Record) -> bool:
+        """Normalizes a record's POS/REF/ALT (and HGVS notation) in place. Returns True if changed."""
+        pos, ref, alt = self.normalize(
+            record.CHROM, int(record.POS), record.REF, record.ALT
+        )
+        if (str(pos), ref, alt) == (str(record.POS), record.REF, record.ALT):
+            return False
+
+        record.POS, record.REF, record.ALT = str(pos), ref, alt
+        record.hgvs = hgvs_string(record.CHROM, record.POS, record.REF, record.ALT)
+        return True
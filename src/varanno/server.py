@@ -0,0 +1,195 @@
+import io
+import os
+import csv
+import sys
+import json
+import logging
+import itertools
+import requests
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .cache import DEFAULT_CACHE_SIZE, VEPResultCache
+from .filters import FilterExpressionError
+from .record import VEP_QUERY_MODES, VariantAnnotation
+from .vcf import Reader, ReaderError
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7373
+
+# Marks a job which failed after results started streaming (the status is already sent)
+STREAM_ERROR_PREFIX = "# varanno error: "
+
+
+def job_options(job: dict) -> tuple[int, str]:
+    """Validates a job's batch size and query mode, returning them (with their defaults)."""
+    batch_size = job.get("batch_size", 50)
+    if type(batch_size) is not int or batch_size < 1:
+        raise ValueError(f"Batch size must be a positive integer: {batch_size!r}")
+
+    query_mode = job.get("query_mode", "hgvs")
+    # The server has no gene index, so only the VEP query modes are supported
+    if query_mode not in VEP_QUERY_MODES:
+        raise ValueError(f"Query mode must be one of {VEP_QUERY_MODES}: {query_mode!r}")
+    return batch_size, query_mode
+
+
+class AnnotationServer(ThreadingHTTPServer):
+    """Long-lived annotation server, keeping a warm VEP result cache across jobs.
+
+    Jobs run concurrently (one thread per request), share the pooled VEP API
+    connections, and identical in-flight queries from concurrent jobs are coalesced
+    by the shared `VEPResultCache`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, cache: VEPResultCache | None = None):
+        super().__init__(address, AnnotationRequestHandler)
+        self.cache = cache if cache is not None else VEPResultCache(DEFAULT_CACHE_SIZE)
+        self.job_ids = itertools.count(1)
+        self.num_jobs = 0
+
+
+class AnnotationRequestHandler(BaseHTTPRequestHandler):
+    """Handles `GET /health` and `POST /annotate` requests.
+
+    `POST /annotate` takes a JSON job, e.g.
+    `{"infile": "/path/to.vcf", "filters": ["FILTER==PASS"], "query_mode": "hgvs"}`,
+    and streams the annotations back as CSV (chunked), one batch at a time. Jobs are
+    validated before any results are sent; invalid jobs get a 400 response.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: AnnotationServer
+
+    def log_message(self, format, *args):
+        log.info(f"{self.address_string()} - {format % args}")
+
+    def send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, text: str):
+        data = text.encode()
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self.send_json(404, {"error": "Not found"})
+
+        cache = self.server.cache
+        self.send_json(
+            200,
+            {
+                "status": "ok",
+                "jobs": self.server.num_jobs,
+                "cache_size": len(cache),
+                "cache_hits": cache.hits,
+                "cache_misses": cache.misses,
+            },
+        )
+
+    def do_POST(self):
+        if self.path != "/annotate":
+            return self.send_json(404, {"error": "Not found"})
+
+        try:
+            job = json.loads(
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            )
+            batch_size, query_mode = job_options(job)
+            reader = Reader(job["infile"], filters=job.get("filters"))
+            reader.read_header()
+        except (ValueError, KeyError, TypeError, FilterExpressionError) as err:
+            return self.send_json(400, {"error": f"Invalid job: {err!r}"})
+        except (OSError, ReaderError) as err:
+            return self.send_json(400, {"error": f"Unable to read input: {err!r}"})
+
+        self.server.num_jobs = job_no = next(self.server.job_ids)
+        log.info(f"Annotation job #{job_no}: {reader.infile}")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=VariantAnnotation.__slots__)
+        writer.writeheader()
+        try:
+            annotations = reader.annotation_generator(
+                batch_size, self.server.cache, query_mode
+            )
+            for i, variant in enumerate(annotations, start=1):
+                writer.writerow(asdict(variant))
+                if i % batch_size == 0:
+                    self.send_chunk(buffer.getvalue())
+                    buffer.seek(0)
+                    buffer.truncate()
+        except Exception as err:
+            log.exception(f"Annotation job failed: {reader.infile}")
+            buffer.write(f"{STREAM_ERROR_PREFIX}{err!r}\n")
+
+        if buffer.getvalue():
+            self.send_chunk(buffer.getvalue())
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    cache_size: int | None = DEFAULT_CACHE_SIZE,
+):
+    """Runs the annotation server until interrupted.
+
+    The result cache holds at most `cache_size` results (None for no limit).
+    """
+    server = AnnotationServer((host, port), VEPResultCache(max_size=cache_size))
+    log.info(f"varanno server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Shutting down varanno server")
+    finally:
+        server.server_close()
+
+
+def submit(
+    infile: str,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    filters: list[str] | None = None,
+    query_mode: str = "hgvs",
+    out=None,
+) -> bool:
+    """Submits an annotation job to a running server and streams the CSV results to `out`.
+
+    Returns False if the job failed.
+    """
+    out = out or sys.stdout
+    job = {
+        "infile": os.path.abspath(infile),
+        "filters": filters or [],
+        "query_mode": query_mode,
+    }
+    with requests.post(f"http://{host}:{port}/annotate", json=job, stream=True) as res:
+        if not res.ok:
+            log.error(f"Annotation job rejected: {res.text}")
+            return False
+
+        ok = True
+        for line in res.iter_lines(decode_unicode=True):
+            if line.startswith(STREAM_ERROR_PREFIX):
+                log.error(line)
+                ok = False
+            else:
+                out.write(line + "\n")
+            out.flush()
+        return ok
@@ -0,0 +1,209 @@
+import json
+import sqlite3
+import logging
+from dataclasses import astuple
+from .fields import format_value
+from .record import VariantAnnotation
+
+
+log = logging.getLogger(__name__)
+
+# SQLite column types of the `VariantAnnotation` fields (TEXT otherwise)
+COLUMN_TYPES = {
+    "POS": "INTEGER",
+    "minor_allele_frequency": "REAL",
+    "depth_of_sequence_coverage": "REAL",
+    "num_reads_supporting_variant": "REAL",
+    "pct_reads_supporting_variant": "REAL",
+}
+
+INDEXES = {
+    "idx_annotations_gene_id": "gene_id",
+    "idx_annotations_region": "CHROM, POS",
+    "idx_annotations_variant_effect": "variant_effect",
+}
+
+
+class AnnotationStore:
+    """SQLite store of the annotations of many samples, indexed for lookups.
+
+    A sample's rows are staged batch by batch in a temporary table, private to the
+    connection, so other writers aren't locked out while a file is annotated. The
+    staged rows then replace the sample's previous rows in a single transaction, and
+    the indexes on `gene_id`, (`CHROM`, `POS`) and `variant_effect` are built once
+    the sample is loaded. Each sample's run metadata is kept in the `metadata` table.
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = path
+        # Several processors may write to one store, each waits for the others' transactions
+        self.conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def create_tables(self):
+        columns = ", ".join(
+            f"{field} {COLUMN_TYPES.get(field, 'TEXT')}"
+            for field in VariantAnnotation.__slots__
+        )
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS annotations (sample TEXT NOT NULL, {columns})"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata (sample TEXT PRIMARY KEY, metadata TEXT NOT NULL)"
+            )
+
+    def create_indexes(self):
+        log.info(f"Indexing annotations -> {self.path}")
+        with self.conn:
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_annotations_sample ON annotations (sample)"
+            )
+            for name, columns in INDEXES.items():
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON annotations ({columns})"
+                )
+
+    def delete_sample(self, sample: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM annotations WHERE sample = ?", (sample,))
+            self.conn.execute("DELETE FROM metadata WHERE sample = ?", (sample,))
+
+    def columns(self) -> list[str]:
+        return [
+            row["name"] for row in self.conn.execute("PRAGMA table_info(annotations)")
+        ]
+
+    def add_columns(self, columns: dict[str, str]):
+        """Adds extra field columns (name to SQLite type) not already in the store."""
+        existing = set(self.columns())
+        with self.conn:
+            for name, sql_type in columns.items():
+                if name not in existing:
+                    self.conn.execute(
+                        f'ALTER TABLE annotations ADD COLUMN "{name}" {sql_type}'
+                    )
+
+    def insert(
+        self,
+        sample: str,
+        annotations: list[VariantAnnotation],
+        extras: list[dict] | None = None,
+    ):
+        """Inserts a batch of annotations (and their extra field values) in a single transaction."""
+        with self.conn:
+            self._insert("annotations", sample, annotations, extras)
+
+    def stage(
+        self,
+        sample: str,
+        annotations: list[VariantAnnotation],
+        extras: list[dict] | None = None,
+    ):
+        """Stages a batch of annotations for `load_staged`, without locking the store."""
+        with self.conn:
+            self._create_staged()
+            self._insert("temp.staged", sample, annotations, extras)
+
+    def load_staged(self, sample: str):
+        """Replaces the sample's rows with the staged rows in one transaction, then indexes the store."""
+        log.info(f"Loading staged annotations -> {self.path} (sample {sample})")
+        with self.conn:
+            self._create_staged()
+            columns = ", ".join(
+                f'"{row["name"]}"'
+                for row in self.conn.execute("PRAGMA temp.table_info(staged)")
+            )
+            self.conn.execute("DELETE FROM annotations WHERE sample = ?", (sample,))
+            self.conn.execute("DELETE FROM metadata WHERE sample = ?", (sample,))
+            self.conn.execute(
+                f"INSERT INTO annotations ({columns}) SELECT {columns} FROM temp.staged"
+            )
+            self.conn.execute("DROP TABLE temp.staged")
+        self.create_indexes()
+
+    def _create_staged(self):
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS staged AS SELECT * FROM annotations WHERE 0"
+        )
+
+    def _insert(
+        self,
+        table: str,
+        sample: str,
+        annotations: list[VariantAnnotation],
+        extras: list[dict] | None = None,
+    ):
+        extra_columns = list(extras[0]) if extras else []
+        columns = ", ".join(
+            f'"{col}"'
+            for col in ("sample", *VariantAnnotation.__slots__, *extra_columns)
+        )
+        placeholders = ", ".join(
+            "?" * (len(VariantAnnotation.__slots__) + len(extra_columns) + 1)
+        )
+        rows = (
+            (
+                sample,
+                *astuple(variant),
+                *(format_value(extra[col]) for col in extra_columns),
+            )
+            for variant, extra in zip(annotations, extras or [{}] * len(annotations))
+        )
+        self.conn.executemany(
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows
+        )
+
+    def write_metadata(self, sample: str, metadata: dict):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                (sample, json.dumps(metadata)),
+            )
+
+    def samples(self) -> list[str]:
+        return [
+            row["sample"]
+            for row in self.conn.execute("SELECT sample FROM metadata ORDER BY sample")
+        ]
+
+    def metadata(self, sample: str) -> dict | None:
+        row = self.conn.execute(
+            "SELECT metadata FROM metadata WHERE sample = ?", (sample,)
+        ).fetchone()
+        return json.loads(row["metadata"]) if row else None
+
+    def query(
+        self, where: str, params: tuple, sample: str | None = None
+    ) -> list[sqlite3.Row]:
+        if sample is not None:
+            where, params = f"{where} AND sample = ?", (*params, sample)
+        return self.conn.execute(
+            f"SELECT * FROM annotations WHERE {where}", params
+        ).fetchall()
+
+    def by_gene(self, gene_id: str, sample: str | None = None) -> list[sqlite3.Row]:
+        return self.query("gene_id = ?", (gene_id,), sample)
+
+    def by_region(
+        self, chrom: str, start: int, end: int, sample: str | None = None
+    ) -> list[sqlite3.Row]:
+        """Annotations with `start <= POS <= end` on `chrom`."""
+        return self.query(
+            "CHROM = ? AND POS BETWEEN ? AND ?", (chrom, start, end), sample
+        )
+
+    def by_effect(
+        self, variant_effect: str, sample: str | None = None
+    ) -> list[sqlite3.Row]:
+        return self.query("variant_effect = ?", (variant_effect,), sample)
@@ -0,0 +1,129 @@
+import math
+import numpy as np
+from collections import Counter
+from .record import VariantAnnotation
+
+
+class Histogram:
+    """Fixed-bin histogram over [lo, hi), with an extra last bin for values >= hi.
+
+    Missing or non-numeric values are counted separately, so memory use never
+    depends on the number of values added.
+    """
+
+    def __init__(self, lo: float, hi: float, bins: int):
+        self.lo = lo
+        self.hi = hi
+        self.bins = bins
+        self.counts = np.zeros(bins + 1, dtype=np.int64)
+        self.missing = 0
+
+    def add(self, value):
+        if not isinstance(value, (int, float)) or math.isnan(value):
+            self.missing += 1
+            return
+
+        idx = int((value - self.lo) / (self.hi - self.lo) * self.bins)
+        self.counts[min(max(idx, 0), self.bins)] += 1
+
+    def merge(self, other: "Histogram"):
+        if (self.lo, self.hi, self.bins) != (other.lo, other.hi, other.bins):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+        self.missing += other.missing
+
+    def scaled(self, factor: float) -> "Histogram":
+        hist = Histogram(self.lo, self.hi, self.bins)
+        hist.counts = np.rint(self.counts * factor).astype(np.int64)
+        hist.missing = round(self.missing * factor)
+        return hist
+
+    def edges(self) -> list[float]:
+        return np.linspace(self.lo, self.hi, self.bins + 1).tolist()
+
+    def to_dict(self) -> dict:
+        return {
+            "lo": self.lo,
+            "hi": self.hi,
+            "bins": self.bins,
+            "edges": self.edges(),
+            "counts": self.counts.tolist(),
+            "missing": self.missing,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        hist = cls(data["lo"], data["hi"], data["bins"])
+        hist.counts = np.array(data["counts"], dtype=np.int64)
+        hist.missing = data["missing"]
+        return hist
+
+
+class AnnotationSummary:
+    """Aggregates annotation counts and distributions incrementally.
+
+    Summaries are mergeable: the summaries of several shards of a file (or of
+    several files) can be combined with `merge` without rereading the output.
+    """
+
+    _counted = ("variant_type", "variant_effect", "genotype", "gene_id")
+
+    def __init__(self):
+        self.num_variants = 0
+        self.counts = {field: Counter() for field in self._counted}
+        self.coverage = Histogram(0, 1000, 100)
+        self.maf = Histogram(0, 1, 20)
+
+    def add(self, annotation: VariantAnnotation):
+        self.num_variants += 1
+        for field in self._counted:
+            self.counts[field][str(getattr(annotation, field))] += 1
+
+        self.coverage.add(annotation.depth_of_sequence_coverage)
+        self.maf.add(annotation.minor_allele_frequency)
+
+    def merge(self, other: "AnnotationSummary"):
+        self.num_variants += other.num_variants
+        for field in self._counted:
+            self.counts[field].update(other.counts[field])
+
+        self.coverage.merge(other.coverage)
+        self.maf.merge(other.maf)
+        return self
+
+    def scaled(self, factor: float) -> "AnnotationSummary":
+        """A copy with all counts multiplied by `factor` (rounded), e.g. to extrapolate a sample."""
+        summary = AnnotationSummary()
+        summary.num_variants = round(self.num_variants * factor)
+        for field in self._counted:
+            summary.counts[field] = Counter(
+                {
+                    key: round(count * factor)
+                    for key, count in self.counts[field].items()
+                }
+            )
+
+        summary.coverage = self.coverage.scaled(factor)
+        summary.maf = self.maf.scaled(factor)
+        return summary
+
+    def to_dict(self) -> dict:
+        return {
+            "num_variants": self.num_variants,
+            **{
+                field: dict(self.counts[field].most_common()) for field in self._counted
+            },
+            "depth_of_sequence_coverage": self.coverage.to_dict(),
+            "minor_allele_frequency": self.maf.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AnnotationSummary":
+        summary = cls()
+        summary.num_variants = data["num_variants"]
+        for field in cls._counted:
+            summary.counts[field] = Counter(data[field])
+
+        summary.coverage = Histogram.from_dict(data["depth_of_sequence_coverage"])
+        summary.maf = Histogram.from_dict(data["minor_allele_frequency"])
+        return summary
@@ -0,0 +1,75 @@
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from .fileio import read_bed
+from .genes import normalize_chrom
+from .record import OFF_TARGET, Record
+
+
+log = logging.getLogger(__name__)
+
+TARGET_MODES = ("drop", "tag")
+
+
+class TargetRegions:
+    """Target regions (e.g. an exome capture kit) as sorted, merged intervals per chromosome.
+
+    Overlapping and adjacent intervals are merged when the index is built, so a
+    position is on target iff the last interval starting at or before it also ends
+    at or after it: one binary search per record. Chromosome names match with or
+    without a "chr" prefix.
+    """
+
+    def __init__(self, intervals):
+        by_chrom = defaultdict(list)
+        for chrom, start, end, *_ in intervals:
+            by_chrom[normalize_chrom(chrom)].append((start, end))
+
+        self.starts = {}
+        self.ends = {}
+        for chrom, chrom_intervals in by_chrom.items():
+            starts, ends = [], []
+            for start, end in sorted(chrom_intervals):
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.starts[chrom] = starts
+            self.ends[chrom] = ends
+
+    @classmethod
+    def from_bed(cls, path: str) -> "TargetRegions":
+        targets = cls(read_bed(path))
+        log.info(
+            f"Loaded {len(targets)} target regions ({targets.size} bp) from {path}"
+        )
+        return targets
+
+    def __len__(self):
+        return sum(len(starts) for starts in self.starts.values())
+
+    @property
+    def size(self) -> int:
+        """Total number of targeted bases."""
+        return sum(
+            end - start + 1
+            for chrom in self.starts
+            for start, end in zip(self.starts[chrom], self.ends[chrom])
+        )
+
+    def contains(self, chrom: str, pos: int) -> bool:
+        """Whether the 1-based position `chrom:pos` is inside a target region."""
+        chrom = normalize_chrom(chrom)
+        if chrom not in self.starts:
+            return False
+        i = bisect_right(self.starts[chrom], pos) - 1
+        return i >= 0 and pos <= self.ends[chrom][i]
+
+
+def tag_off_target(record: Record):
+    """Adds the off-target tag to the record's FILTER column (replacing PASS or missing)."""
+    if record.FILTER in ("PASS", ".", ""):
+        record.FILTER = OFF_TARGET
+    elif not record.is_off_target:
+        record.FILTER = f"{record.FILTER};{OFF_TARGET}"
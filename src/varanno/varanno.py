@@ -1,55 +1,258 @@
 import csv
 import os
 import sys
+import time
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager, nullcontext
 from dataclasses import asdict
 from .fileio import write_metadata_json, write_logs
-from .record import VariantAnnotation
-from .vcf import Reader, Record
+from .record import OFF_TARGET, OFF_TARGET_ERROR, VariantAnnotation
+from .genotype import GENOTYPE_FIELDS, decode_genotypes
+from .summary import AnnotationSummary
+from .filters import parse_filters
+from .cache import DEFAULT_CACHE_SIZE, VEPResultCache
+from .degraded import CircuitBreaker
+from .store import AnnotationStore
+from .genes import GeneIndex
+from .preview import (
+    PREVIEW_STRATA,
+    reservoir_sample,
+    stratum_key,
+    stratum_batches,
+    extrapolated_summary,
+    preview_metadata,
+)
+from .extsort import SORT_BUFFER_MB, sort_annotations
+from .fields import FieldExtractor, format_value
+from .record import annotate_batch
+from .columnar import annotate_batch_columnar
+from .planner import BatchLatency, QueryPlan, plan_queries, read_batch_latency
+from .reference import ReferenceGenome
+from .targets import TARGET_MODES, TargetRegions
+from .vcfout import annotated_header, annotated_line
+from .vcf import Reader, MmapReader, Record, STDIN
+
+__all__ = [
+    "VCFProcessor",
+    "Reader",
+    "MmapReader",
+    "Record",
+    "VariantAnnotation",
+    "AnnotationSummary",
+    "VEPResultCache",
+    "AnnotationStore",
+    "GeneIndex",
+    "process_many",
+]
 
-__all__ = ["VCFProcessor", "Reader", "Record", "VariantAnnotation"]
+LOG_FORMAT = "[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s"
 
 stdout_handler = logging.StreamHandler(stream=sys.stdout)
 handlers = [stdout_handler]
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="[%(asctime)s] {%(filename)s:%(lineno)d} %(levelname)s - %(message)s",
-    handlers=handlers,
-)
+logging.basicConfig(level=logging.DEBUG, format=LOG_FORMAT, handlers=handlers)
 
 log = logging.getLogger(__name__)
 
+# Runs currently streaming to stdout, which have moved console logs to stderr
+_console_lock = threading.Lock()
+_num_streaming_runs = 0
+_console_stream = None
+
+READER_BACKENDS = {"text": Reader, "mmap": MmapReader}
+
+OUTPUT_FORMATS = ("csv", "vcf")
+
+
+@contextmanager
+def run_logging(log_file: str):
+    """Writes the logs of the current thread to `log_file` until the run exits.
+
+    Only records logged by the calling thread are written, so runs in parallel
+    threads each get their own log. The handler is removed and closed on exit.
+    """
+    thread = threading.get_ident()
+    handler = logging.FileHandler(filename=log_file)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(lambda record: record.thread == thread)
+    log.root.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        log.root.removeHandler(handler)
+        handler.close()
+
+
+@contextmanager
+def console_to_stderr():
+    """Keeps stdout clean for streamed output, sending console logs to stderr instead.
+
+    Console logs go back to their stream once the last streaming run exits.
+    """
+    global _num_streaming_runs, _console_stream
+    with _console_lock:
+        if not _num_streaming_runs:
+            _console_stream = stdout_handler.setStream(sys.stderr)
+        _num_streaming_runs += 1
+    try:
+        yield
+    finally:
+        with _console_lock:
+            _num_streaming_runs -= 1
+            if not _num_streaming_runs:
+                stdout_handler.setStream(_console_stream)
+
 
 class VCFProcessor:
-    def __init__(self, infile: str, outdir: str, allow_overrides: bool = True):
+    def __init__(
+        self,
+        infile: str,
+        outdir: str,
+        allow_overrides: bool = True,
+        reader_backend: str = "text",
+        stream_output: bool = False,
+        batch_size: int = 50,
+        filters: list[str] | None = None,
+        cache: VEPResultCache | None = None,
+        query_mode: str = "hgvs",
+        max_vep_failures: int | None = None,
+        vep_deadline: float | None = None,
+        store: str | None = None,
+        sample: str | None = None,
+        gene_index: GeneIndex | None = None,
+        preview: int | None = None,
+        preview_by: str | None = None,
+        fields: list[str] | None = None,
+        reference: ReferenceGenome | None = None,
+        output_format: str = "csv",
+        targets: TargetRegions | None = None,
+        target_mode: str = "drop",
+        sort_output: bool = False,
+        sort_buffer: float = SORT_BUFFER_MB,
+        columnar: bool = False,
+    ):
         self.infile = infile
         self.outdir = outdir
         self.allow_overrides = allow_overrides
+        self.reader_cls = READER_BACKENDS[reader_backend]
+        self.stream_output = stream_output
+        self.batch_size = batch_size
+        self.filters = parse_filters(filters)
+        self.cache = cache
+        self.query_mode = query_mode
+        self.gene_index = gene_index
+        if query_mode == "genes" and gene_index is None:
+            raise ValueError("The 'genes' query mode requires a gene index")
+        self.max_vep_failures = max_vep_failures
+        self.vep_deadline = vep_deadline
+        self.store_file = store
+        self.sample = sample or os.path.basename(str(infile)).split(".")[0]
+        self.preview = preview
+        self.preview_by = preview_by
+        if preview_by is not None and preview_by not in PREVIEW_STRATA:
+            raise ValueError(f"Preview strata must be one of {PREVIEW_STRATA}")
+        self.fields = fields or []
+        self.reference = reference
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Output format must be one of {OUTPUT_FORMATS}")
+        self.output_format = output_format
+        self.targets = targets
+        if target_mode not in TARGET_MODES:
+            raise ValueError(f"Off-target mode must be one of {TARGET_MODES}")
+        self.target_mode = target_mode
+        if (max_vep_failures is not None or vep_deadline is not None) and (
+            output_format != "csv" or store or stream_output
+        ):
+            raise ValueError(
+                "Degraded mode (a VEP failure limit or deadline) requires CSV output "
+                "files, the only output `backfill` can patch"
+            )
+        self.sort_output = sort_output
+        self.sort_buffer = sort_buffer
+        self.columnar = columnar
 
-        # Set output file paths
-        self.annotation_file = os.path.join(self.outdir, "annotations.csv")
+        # Set output file paths (annotations go to stdout when streaming)
+        self.annotation_file = (
+            STDIN
+            if stream_output
+            else os.path.join(self.outdir, f"annotations.{output_format}")
+        )
         self.metadata_file = os.path.join(self.outdir, "metadata.json")
+        self.summary_file = os.path.join(self.outdir, "summary.json")
+        self.genotype_file = os.path.join(self.outdir, "genotypes.csv")
         self.error_file = os.path.join(self.outdir, "errors.log")
+        self.retry_queue_file = os.path.join(self.outdir, "retry_queue.tsv")
         self.log_file = os.path.join(self.outdir, "tmp.log")
+        self._lock = threading.Lock()
+
+    def process(self) -> dict:
+        """Annotates the input file, returning the details of the run (see `run_metadata`).
 
-    def process(self):
+        The state of a run (reader, counters, summary) is rebuilt on each call, and
+        its logs go to its own `tmp.log`. A failed run logs its error there too.
+        Independent processors can run in parallel threads; concurrent calls on the
+        same processor, which would write the same output files, run one after
+        another.
+        """
         self.validate_input_file()
 
-        # Ensure output dir exists, override if allowed
-        os.makedirs(self.outdir, exist_ok=self.allow_overrides)
-        log.root.addHandler(logging.FileHandler(filename=self.log_file))
+        with self._lock:
+            # Ensure output dir exists, override if allowed
+            os.makedirs(self.outdir, exist_ok=self.allow_overrides)
 
+            console = console_to_stderr() if self.stream_output else nullcontext()
+            with run_logging(self.log_file), console:
+                try:
+                    return self._process()
+                except Exception:
+                    log.exception(f"Failed to annotate {self.infile}")
+                    raise
+
+    def _process(self) -> dict:
         log.info(f"Annotating VCF! {self.infile} -> {self.outdir}")
-        self.reader = Reader(self.infile)
+        self.reader = self.create_reader(keep_lines=self.output_format == "vcf")
+        self.batch_latency = BatchLatency()
+        self.breaker = self.circuit_breaker()
+        self.extractor = self.field_extractor()
 
         # Generate variant annotations and write to file
-        annotation_gen = self.reader.annotation_generator()
-        self.write_record_annotations(annotation_gen)
+        if self.preview:
+            annotation_gen = self.annotate(self.preview_batches())
+        else:
+            annotation_gen = self.annotate(self.reader.batches(self.batch_size))
+        if self.sort_output:
+            # Sorted runs are spilled next to the output, not to a (possibly small) /tmp
+            annotation_gen = sort_annotations(
+                annotation_gen, self.sort_buffer, self.outdir
+            )
+        try:
+            if self.store_file:
+                self.write_store_annotations(self.store_file, annotation_gen)
+            elif self.output_format == "vcf":
+                self.write_vcf_annotations(annotation_gen)
+            else:
+                self.write_record_annotations(annotation_gen)
+        finally:
+            # Closes the input file and removes sort runs, even if writing failed
+            annotation_gen.close()
+
+        # Preview summaries are estimated for the whole file from the sample
+        if self.preview:
+            self.summary = extrapolated_summary(self.strata)
+
+        # Write summary statistics to file
+        log.info(f"Writing summary JSON -> {self.summary_file}")
+        write_metadata_json(self.summary.to_dict(), self.summary_file)
 
         # Write metadata to file
         log.info(f"Writing metadata JSON -> {self.metadata_file}")
-        write_metadata_json(self.reader.metadata, self.metadata_file)
+        metadata = {**self.reader.metadata, "run": self.run_metadata()}
+        write_metadata_json(metadata, self.metadata_file)
+        if self.store_file:
+            self.write_store_metadata(self.store_file, metadata)
 
         # Write errors to file
         if self.reader.errors:
@@ -58,16 +261,306 @@ class VCFProcessor:
             )
             write_logs([err.logstr() for err in self.reader.errors], self.error_file)
 
+        return metadata["run"]
+
+    def annotate(self, batches):
+        """Yields each record in `batches` with its annotation and extra field values.
+
+        Per-sample genotypes of multi-sample (cohort) VCFs are decoded and written to
+        `genotypes.csv` batch by batch, in the same pass over the input.
+        """
+        log.info(f"Annotating records: Batch size {self.batch_size}")
+
+        with ExitStack() as stack:
+            genotypes = None
+            for batch_no, batch in enumerate(batches, start=1):
+                if len(self.reader.samples) > 1 and not self.preview:
+                    if genotypes is None:
+                        genotypes = stack.enter_context(self.genotype_writer())
+                    genotypes.writerows(
+                        decode_genotypes(batch, self.reader.samples).long_rows()
+                    )
+                yield from self.annotate_records(batch)
+                log.info(f"Successfully processed batch #{batch_no}")
+
+    def annotate_records(self, batch: list[Record]):
+        """Annotates a batch of records, yielding each with its annotation and extra fields."""
+        misses = self.cache.misses if self.cache is not None else None
+        start = time.monotonic()
+        if self.columnar:
+            annotations = list(
+                annotate_batch_columnar(
+                    batch,
+                    cache=self.cache,
+                    query_mode=self.query_mode,
+                    breaker=self.breaker,
+                    gene_index=self.gene_index,
+                ).rows()
+            )
+        else:
+            annotations = list(
+                annotate_batch(
+                    batch, self.cache, self.query_mode, self.breaker, self.gene_index
+                )
+            )
+        # Record the latency of batches which queried VEP, for dry run estimates
+        if self.query_mode != "genes" and (
+            self.cache.misses > (misses or 0)
+            if self.cache is not None
+            else any(not rec.is_off_target for rec in batch)
+        ):
+            self.batch_latency.add(time.monotonic() - start)
+        extras = self.extractor.extract(batch) if self.extractor else [{}] * len(batch)
+
+        for record, variant, extra in zip(batch, annotations, extras):
+            if self.preview:
+                self.strata[stratum_key(record, self.preview_by)].summary.add(variant)
+            yield record, variant, extra
+
+    def create_reader(self, keep_lines: bool = False) -> Reader:
+        return self.reader_cls(
+            self.infile,
+            filters=self.filters,
+            reference=self.reference,
+            keep_lines=keep_lines,
+            targets=self.targets,
+            target_mode=self.target_mode,
+        )
+
+    def dry_run(self, latency_from: str | None = None) -> QueryPlan:
+        """Plans the run's VEP queries without annotating, writing or querying anything.
+
+        Records are read with the run's filters, targets and normalization, and the
+        wall time is estimated from the VEP latency recorded by a previous run at
+        `latency_from` (its metadata.json or output directory, by default `outdir`).
+        """
+        self.validate_input_file()
+        self.reader = self.create_reader()
+
+        batch_seconds = read_batch_latency(latency_from or self.outdir, self.batch_size)
+        plan = plan_queries(
+            self.reader.read(),
+            self.batch_size,
+            self.cache,
+            self.query_mode,
+            batch_seconds,
+        )
+        log.info(
+            f"Dry run: {plan.num_records} records, {plan.num_unique_notations} unique "
+            f"notations, {plan.num_query_batches} VEP batches"
+        )
+        return plan
+
+    def preview_batches(self):
+        """Batches of a reservoir sample of `preview` records (per stratum if `preview_by` is set)."""
+        log.info(
+            f"Preview: sampling {self.preview} records (stratified by {self.preview_by})"
+        )
+        self.strata = reservoir_sample(
+            self.reader.read(), self.preview, self.preview_by
+        )
+        return stratum_batches(self.strata, self.batch_size)
+
+    def field_extractor(self) -> FieldExtractor | None:
+        """Typed extractor of the extra INFO/FORMAT fields, compiled from the VCF header."""
+        if not self.fields:
+            return None
+        self.reader.read_header()
+        return FieldExtractor.from_metadata(self.fields, self.reader.metadata)
+
+    def circuit_breaker(self) -> CircuitBreaker | None:
+        """Degraded mode: used if a VEP failure limit or deadline is set."""
+        if self.max_vep_failures is None and self.vep_deadline is None:
+            return None
+
+        if os.path.exists(self.retry_queue_file):
+            os.remove(self.retry_queue_file)
+
+        return CircuitBreaker(
+            self.retry_queue_file,
+            max_failures=self.max_vep_failures or 3,
+            deadline=self.vep_deadline,
+            query_mode=self.query_mode,
+        )
+
+    def run_metadata(self) -> dict:
+        """Details of this run, added to the metadata JSON under the "run" key."""
+        if self.filters:
+            log.info(f"Filtered out {self.reader.num_filtered} records")
+        if self.targets is not None:
+            log.info(
+                f"{self.reader.num_off_target} records outside the target regions "
+                f"({'tagged' if self.target_mode == 'tag' else 'dropped'})"
+            )
+        run = {
+            "query_mode": self.query_mode,
+            "filters": [str(filt) for filt in self.filters],
+            "num_filtered_records": self.reader.num_filtered,
+            "num_normalized_records": self.reader.num_normalized,
+            "num_off_target_records": self.reader.num_off_target,
+            "num_queued_for_backfill": self.breaker.num_queued if self.breaker else 0,
+            "fields": [str(spec) for spec in self.extractor.specs]
+            if self.extractor
+            else [],
+            "vep_latency": self.batch_latency.to_dict(self.batch_size),
+        }
+        if self.preview:
+            run["preview"] = preview_metadata(self.strata)
+        return run
+
     def validate_input_file(self):
-        if not os.path.exists(self.infile):
+        if self.infile != STDIN and not os.path.exists(self.infile):
             raise FileExistsError("Input file not found")
 
     def write_record_annotations(self, annotation_gen):
         log.info(f"Generating record annotations -> {self.annotation_file}")
+        self.summary = AnnotationSummary()
+
+        columns = self.extractor.columns if self.extractor else []
+        with self._open_annotation_file() as fle:
+            writer = csv.DictWriter(
+                fle, fieldnames=[*VariantAnnotation.__slots__, *columns]
+            )
+            writer.writeheader()
+
+            for i, (_, variant, extra) in enumerate(annotation_gen, start=1):
+                self.summary.add(variant)
+                writer.writerow(
+                    {
+                        **asdict(variant),
+                        **{key: format_value(val) for key, val in extra.items()},
+                    }
+                )
+
+                # Emit rows downstream as soon as each batch is complete
+                if i % self.batch_size == 0:
+                    fle.flush()
+
+    def write_vcf_annotations(self, annotation_gen):
+        """Writes the input VCF back out, with the annotations appended to each line's INFO.
+
+        Records tagged off-target also get the tag in their FILTER column.
+        """
+        log.info(f"Generating annotated VCF -> {self.annotation_file}")
+        self.summary = AnnotationSummary()
+
+        # The header is written before the first record is read
+        if self.reader.data_offset is None:
+            self.reader.read_header()
+
+        with self._open_annotation_file() as fle:
+            # Off-target records are tagged in their FILTER column
+            filters = (
+                {OFF_TARGET: OFF_TARGET_ERROR}
+                if self.targets is not None and self.target_mode == "tag"
+                else None
+            )
+            fle.write(annotated_header(self.reader.header_lines, filters))
 
-        with open(self.annotation_file, "wt") as fle:
-            writer = csv.DictWriter(fle, fieldnames=VariantAnnotation.__slots__)
+            for i, (record, variant, _) in enumerate(annotation_gen, start=1):
+                self.summary.add(variant)
+                fle.write(annotated_line(record, variant))
+
+                # Emit lines downstream as soon as each batch is complete
+                if i % self.batch_size == 0:
+                    fle.flush()
+
+    def write_store_annotations(self, store_file: str, annotation_gen):
+        """Loads annotations into the SQLite store, replacing any previous rows for the sample.
+
+        The previous rows are only replaced once every annotation is staged, so a
+        failed run leaves them in place.
+        """
+        log.info(f"Staging record annotations -> {store_file} (sample {self.sample})")
+        self.summary = AnnotationSummary()
+
+        with AnnotationStore(store_file) as store:
+            if self.extractor:
+                store.add_columns(self.extractor.sql_types)
+
+            batch, extras = [], []
+            for _, variant, extra in annotation_gen:
+                self.summary.add(variant)
+                batch.append(variant)
+                extras.append(extra)
+                if len(batch) == self.batch_size:
+                    store.stage(self.sample, batch, extras)
+                    batch, extras = [], []
+            if batch:
+                store.stage(self.sample, batch, extras)
+            store.load_staged(self.sample)
+
+    def write_store_metadata(self, store_file: str, metadata: dict):
+        with AnnotationStore(store_file) as store:
+            store.write_metadata(self.sample, metadata)
+
+    def _open_annotation_file(self):
+        if self.annotation_file == STDIN:
+            return nullcontext(sys.stdout)
+        return open(self.annotation_file, "wt")
+
+    @contextmanager
+    def genotype_writer(self):
+        log.info(
+            f"Writing genotypes for {len(self.reader.samples)} samples -> {self.genotype_file}"
+        )
+
+        with open(self.genotype_file, "wt") as fle:
+            writer = csv.DictWriter(fle, fieldnames=GENOTYPE_FIELDS)
             writer.writeheader()
+            yield writer
+
+
+def output_dirs(infiles: list[str], outdir: str) -> list[str]:
+    """One output directory per input file within `outdir`, named after the file."""
+    seen: Counter = Counter()
+    dirs = []
+    for infile in infiles:
+        name = os.path.basename(str(infile)).split(".")[0]
+        seen[name] += 1
+        if seen[name] > 1:
+            name = f"{name}_{seen[name]}"
+        dirs.append(os.path.join(outdir, name))
+    return dirs
+
+
+def process_many(
+    infiles: list[str],
+    outdir: str,
+    workers: int = 4,
+    cache: VEPResultCache | None = None,
+    **kwargs,
+) -> dict[str, BaseException]:
+    """Annotates many VCF files in parallel, each into its own directory in `outdir`.
+
+    Files are processed by a shared thread pool, and share pooled VEP API connections
+    and a `VEPResultCache` (bounded to `DEFAULT_CACHE_SIZE` results unless one is
+    given), so HGVS notations common to several files are queried once.
+    Extra keyword arguments are passed to each `VCFProcessor`, e.g. a shared
+    `store` to load every file into one SQLite store (named by output directory).
+
+    Returns the errors of any files which failed, keyed by input file.
+    """
+    cache = cache if cache is not None else VEPResultCache(DEFAULT_CACHE_SIZE)
+    processors = [
+        VCFProcessor(infile, dest, cache=cache, sample=os.path.basename(dest), **kwargs)
+        for infile, dest in zip(infiles, output_dirs(infiles, outdir))
+    ]
+
+    log.info(
+        f"Annotating {len(processors)} VCF files with {workers} workers -> {outdir}"
+    )
+    failures: dict[str, BaseException] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(proc.process): proc for proc in processors}
+        for future in as_completed(futures):
+            proc = futures[future]
+            if err := future.exception():
+                log.error(f"Failed to annotate {proc.infile}: {err!r}")
+                failures[proc.infile] = err
 
-            for variant in map(asdict, annotation_gen):
-                writer.writerow(variant)
+    log.info(
+        f"Annotated {len(processors) - len(failures)}/{len(processors)} files, "
+        f"{cache.misses} VEP notations queried, {cache.hits} reused"
+    )
+    return failures
@@ -1,54 +1,182 @@
 import re
+import sys
+import mmap
+import codecs
 import logging
+from typing import Sequence
+from contextlib import nullcontext
 from .record import Record, annotate_batch
+from .genotype import decode_genotypes
+from .columnar import annotate_batch_columnar
+from .filters import RecordFilter, parse_filters
+from .targets import tag_off_target
 from .parse import VCF_META_KEYVAL, VCF_META_STRUCT
 
 
 log = logging.getLogger(__name__)
 
+STDIN = "-"
+
 
 class ReaderError(Exception):
-    def __init__(self, error: str, text: str | None = None, line_no: int | None = None):
+    def __init__(
+        self,
+        error: str,
+        text: str | None = None,
+        line_no: int | None = None,
+        offset: int | None = None,
+    ):
         self.error = error
         self.text = text
         self.line_no = line_no
+        self.offset = offset
         super().__init__(error, text, line_no)
         log.error(self)
 
     def logstr(self):
+        if self.offset is not None:
+            return f"{self.error}: {self.text} [{self.line_no}, byte {self.offset}]"
         return f"{self.error}: {self.text} [{self.line_no}]"
 
 
 class Reader:
+    """Reads the header and records of a VCF file.
+
+    A reader holds the state of one read (header, errors, filter counters), so it
+    isn't shared between threads: concurrent runs each create their own.
+    """
+
     _meta_multi = ("INFO", "FILTER", "FORMAT", "ALT")
     _head_required = {"CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"}
 
-    def __init__(self, infile: str | None = None):
+    def __init__(
+        self,
+        infile: str | None = None,
+        filters: Sequence[str | RecordFilter] | None = None,
+        reference=None,
+        keep_lines: bool = False,
+        targets=None,
+        target_mode: str = "drop",
+    ):
         self.infile = infile
+        self.filters = parse_filters(filters)
+        self.reference = reference
+        self.keep_lines = keep_lines
+        self.targets = targets
+        self.target_mode = target_mode
         self._init_meta()
 
     def _init_meta(self):
         self.metadata = {k: [] for k in self._meta_multi}
         self.header = None
+        self.header_lines = []
+        self.data_offset = None
+        self.data_line_no = None
+        self._init_records()
+
+    def _init_records(self):
         self.records = []
         self.errors = []
+        self.num_filtered = 0
+        self.num_normalized = 0
+        self.num_off_target = 0
+
+    def keep(self, record: Record) -> bool:
+        """Evaluates the reader's filters, counting the records which are excluded.
+
+        If target regions are set, records outside them are dropped first, or tagged
+        in their FILTER column with `target_mode="tag"` (tagged records are kept in
+        the output but not queried on VEP). Records are only tagged once they pass
+        the filters, which see their original FILTER value.
+        """
+        off_target = self.targets is not None and not self.targets.contains(
+            record.CHROM, int(record.POS)
+        )
+        if off_target:
+            self.num_off_target += 1
+            if self.target_mode == "drop":
+                return False
+
+        if not all(filt(record) for filt in self.filters):
+            self.num_filtered += 1
+            return False
+
+        if off_target:
+            tag_off_target(record)
+        return True
+
+    def normalize(self, record: Record) -> Record:
+        """Left-aligns and trims the record's alleles against the reference genome, if set."""
+        if self.reference is not None and self.reference.normalize_record(record):
+            self.num_normalized += 1
+        return record
+
+    @property
+    def samples(self) -> tuple[str, ...]:
+        """Sample names from the header (every column after FORMAT)."""
+        return self.header[9:] if self.header else ()
 
     def meta_structs(self):
         for name in self._meta_multi:
             for data in self.metadata.get(name):
                 yield {"key": name, **data}
 
-    def read(self, infile: str | None = None):
-        self.infile = infile or self.infile
-        self._init_meta()
+    def _set_infile(self, infile: str | None = None):
+        """Switches to a new input file, discarding any cached header."""
+        if infile and infile != self.infile:
+            self.infile = infile
+            self._init_meta()
 
         if not self.infile:
             raise ReaderError("Input file missing")
 
+    def read_header(self, infile: str | None = None):
+        """Parses the metadata and header lines only, stopping at the #CHROM line.
+
+        The parsed metadata and the byte offset where the data lines begin are cached,
+        so later calls to `read()` seek straight to the data instead of reparsing them.
+        """
+        self._set_infile(infile)
+        self._init_meta()
+
+        log.info(f"Reading VCF header: {self.infile}")
+        with self._open_bytes() as fle:
+            offset = 0
+            for line_no, raw in enumerate(fle, start=1):
+                offset += len(raw)
+                line = raw.decode().strip()
+                self.header_lines.append(line)
+
+                try:
+                    if line.startswith("##"):
+                        self.parse_metadata(line, line_no)
+                    elif line.startswith("#"):
+                        self.validate_head(line, line_no)
+                        self.data_offset = offset
+                        self.data_line_no = line_no
+                        break
+                    else:
+                        raise ReaderError("Line format invalid!", line, line_no)
+
+                except ReaderError as err:
+                    log.warning(err)
+                    self.errors.append(err)
+                    raise err
+
+        if self.header is None:
+            raise ReaderError("Missing header line", self.infile)
+
+        return self.metadata
+
+    def read(self, infile: str | None = None):
+        self._set_infile(infile)
+        if self.data_offset is None:
+            self.read_header()
+        self._init_records()
+
         log.info(f"Reading VCF file: {self.infile}")
-        with open(self.infile, "r") as fle:
-            for i, line in enumerate(fle):
-                line_no = i + 1
+        with self._open_data() as fle:
+            for line_no, line in enumerate(fle, start=self.data_line_no + 1):
                 line = line.strip()
 
                 try:
@@ -58,7 +186,8 @@ class Reader:
                         self.validate_head(line, line_no)
                     elif self.header:
                         record = self.build_record(line, line_no)
-                        yield record
+                        if self.keep(record):
+                            yield record
                     else:
                         raise ReaderError("Line format invalid!", line, line_no)
 
@@ -67,6 +196,24 @@ class Reader:
                     self.errors.append(err)
                     raise err
 
+    def _open_bytes(self):
+        """Opens the input file in binary mode (`-` reads from stdin)."""
+        if self.infile == STDIN:
+            return nullcontext(sys.stdin.buffer)
+        return open(self.infile, "rb")
+
+    def _open_data(self):
+        """Opens the input as text, positioned at the first data line.
+
+        Stdin can't seek, but `read_header` leaves it positioned right after the header.
+        """
+        if self.infile == STDIN:
+            return nullcontext(codecs.iterdecode(sys.stdin.buffer, "utf-8"))
+
+        fle = open(self.infile, "r")
+        fle.seek(self.data_offset)
+        return fle
+
     def load_records(self):
         self.records = list(self.read())
         return self.records
@@ -100,29 +247,146 @@ class Reader:
         if len(row) != len(self.header):
             raise ReaderError("Invalid record format!", line, line_no)
 
-        record = Record(*row)
+        record = Record.from_row(row)
         record.line_no = line_no
-        return record
-
-    def annotation_generator(self, batch_size: int = 50):
-        """Yield batches of records annotations from the .read() record generator."""
-        log.info(f"Annotating records: Batch size {batch_size}")
+        if self.keep_lines:
+            record.line = line
+        return self.normalize(record)
 
+    def batches(self, batch_size: int = 50):
+        """Yield lists of up to `batch_size` records from the .read() record generator."""
         batch = []
-        batch_no = 1
         for item in self.read():
             batch.append(item)
             if len(batch) == batch_size:
-                yield from annotate_batch(batch)
-                log.info(f"Successfully processed batch #{batch_no}")
+                yield batch
                 batch = []
-                batch_no += 1
 
         # Yield any remaining items in the final batch
         if batch:
-            yield from annotate_batch(batch)
+            yield batch
+
+    def annotation_generator(
+        self,
+        batch_size: int = 50,
+        cache=None,
+        query_mode: str = "hgvs",
+        breaker=None,
+        gene_index=None,
+    ):
+        """Yield batches of records annotations from the .read() record generator.
+
+        Pass a `VEPResultCache` to reuse VEP results across batches, files or runs.
+        `query_mode` selects the VEP endpoint ("hgvs" or "region", or "genes" to skip
+        VEP), a `CircuitBreaker` keeps the run going without VEP data if VEP fails,
+        and a `GeneIndex` assigns gene_ids locally where VEP has none.
+        """
+        log.info(f"Annotating records: Batch size {batch_size}")
+
+        for batch_no, batch in enumerate(self.batches(batch_size), start=1):
+            yield from annotate_batch(batch, cache, query_mode, breaker, gene_index)
+            log.info(f"Successfully processed batch #{batch_no}")
+
+    def annotation_batches(
+        self,
+        batch_size: int = 50,
+        cache=None,
+        query_mode: str = "hgvs",
+        breaker=None,
+        gene_index=None,
+    ):
+        """Yield columnar annotations (`AnnotationBatch`) for batches of records."""
+        log.info(f"Annotating records (columnar): Batch size {batch_size}")
+
+        for batch_no, batch in enumerate(self.batches(batch_size), start=1):
+            yield annotate_batch_columnar(
+                batch,
+                cache=cache,
+                query_mode=query_mode,
+                breaker=breaker,
+                gene_index=gene_index,
+            )
+            log.info(f"Successfully processed batch #{batch_no}")
+
+    def genotype_batches(self, batch_size: int = 50):
+        """Yield per-sample genotypes for batches of records, decoded into numpy arrays."""
+        for batch in self.batches(batch_size):
+            yield decode_genotypes(batch, self.samples)
 
     @staticmethod
     def splitrow(line: str):
         """Separates columns in a VCF file row. Lines should be tab-delimited."""
         return tuple(re.split(r"\t", line))
+
+
+class MmapReader(Reader):
+    """Reader backend which memory-maps the VCF file and splits it on bytes.
+
+    Lines are read with `mmap.readline` instead of a decoding text-mode iterator, and
+    data lines are validated on raw bytes and decoded once, without the extra strip and
+    regex split. Errors report the byte offset of the offending line. Yields the same
+    `Record` objects as `Reader`.
+    """
+
+    def read(self, infile: str | None = None):
+        self._set_infile(infile)
+        if self.data_offset is None:
+            self.read_header()
+        self._init_records()
+
+        if self.infile == STDIN:
+            log.info("Input is stdin, falling back to the streaming text reader")
+            yield from super().read()
+            return
+
+        log.info(f"Reading VCF file (mmap): {self.infile}")
+        with self._open_bytes() as fle:
+            with mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from self._read_lines(mm, self.data_offset, self.data_line_no)
+
+    def _read_lines(self, mm: mmap.mmap, start: int = 0, line_no: int = 0):
+        mm.seek(start)
+        for raw in iter(mm.readline, b""):
+            line_no += 1
+            line = raw.rstrip(b"\r\n")
+
+            try:
+                if line.startswith(b"#"):
+                    text = line.decode().strip()
+                    if text.startswith("##"):
+                        self.parse_metadata(text, line_no)
+                    else:
+                        self.validate_head(text, line_no)
+                elif self.header:
+                    record = self.build_record_bytes(line, line_no, start)
+                    if self.keep(record):
+                        yield record
+                else:
+                    raise ReaderError(
+                        "Line format invalid!", line.decode(), line_no, start
+                    )
+
+            except ReaderError as err:
+                if err.offset is None:
+                    err.offset = start
+                log.warning(err)
+                self.errors.append(err)
+                raise err
+
+            start += len(raw)
+
+    def build_record_bytes(
+        self, line: bytes, line_no: int | None = None, offset: int | None = None
+    ):
+        # Validate the column count on the raw bytes before decoding anything. A single
+        # decode + split of the line is cheaper in CPython than decoding each column.
+        if line.count(b"\t") != len(self.header) - 1:
+            raise ReaderError("Invalid record format!", line.decode(), line_no, offset)
+
+        text = line.decode()
+        row = text.split("\t")
+        record = Record.from_row(row)
+        record.line_no = line_no
+        if self.keep_lines:
+            record.line = text
+        return self.normalize(record)
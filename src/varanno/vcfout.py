@@ -0,0 +1,76 @@
+from .record import Record, VariantAnnotation
+
+
+# Annotation fields appended to the INFO column: (field, INFO key, Number, Type, Description)
+INFO_FIELDS = (
+    ("gene_id", "VA_GENE", "1", "String", "Gene ID (varanno)"),
+    ("allele_string", "VA_ALLELES", "1", "String", "VEP allele string (varanno)"),
+    ("variant_type", "VA_TYPE", "1", "String", "Variant type (varanno)"),
+    ("variant_effect", "VA_EFFECT", "1", "String", "VEP consequence (varanno)"),
+    (
+        "minor_allele_frequency",
+        "VA_MAF",
+        "1",
+        "Float",
+        "VEP minor allele freq. (varanno)",
+    ),
+)
+
+# Characters with a special meaning in INFO values, percent-encoded as in VCF 4.3
+INFO_ESCAPES = str.maketrans(
+    {";": "%3B", "=": "%3D", ",": "%2C", " ": "%20", "%": "%25"}
+)
+
+
+def info_header_lines() -> list[str]:
+    return [
+        f'##INFO=<ID={key},Number={number},Type={type_},Description="{description}">'
+        for _, key, number, type_, description in INFO_FIELDS
+    ]
+
+
+def annotated_header(
+    header_lines: list[str], filters: dict[str, str] | None = None
+) -> str:
+    """The input header with the annotation `##INFO` lines added before `#CHROM`.
+
+    `filters` (ID to description) declares FILTER tags the run adds to records,
+    unless the input header already declares them.
+    """
+    *meta, head = header_lines
+    filter_lines = [
+        f'##FILTER=<ID={id_},Description="{description}">'
+        for id_, description in (filters or {}).items()
+        if not any(line.startswith(f"##FILTER=<ID={id_},") for line in meta)
+    ]
+    return "\n".join([*meta, *filter_lines, *info_header_lines(), head]) + "\n"
+
+
+def info_suffix(variant: VariantAnnotation) -> str:
+    """The INFO entries for a variant's annotation fields (missing fields are left out)."""
+    return ";".join(
+        f"{key}={str(value).translate(INFO_ESCAPES)}"
+        for field, key, *_ in INFO_FIELDS
+        if (value := getattr(variant, field)) is not None
+    )
+
+
+def annotated_line(record: Record, variant: VariantAnnotation) -> str:
+    """The record's original line, with the annotation entries appended to its INFO column.
+
+    Only the INFO column, and the FILTER column if the run tagged the record (e.g.
+    off-target), are touched: the line is split once around them, and every other
+    column is written back exactly as read.
+    """
+    if record.line is None:
+        raise ValueError("Annotated VCF output needs the records' original lines")
+
+    cols = record.line.split("\t", 8)
+    suffix = info_suffix(variant)
+    if not suffix and cols[6] == record.FILTER:
+        return record.line + "\n"
+
+    cols[6] = record.FILTER
+    if suffix:
+        cols[7] = suffix if cols[7] in (".", "") else f"{cols[7]};{suffix}"
+    return "\t".join(cols) + "\n"
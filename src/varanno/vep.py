@@ -1,15 +1,21 @@
 import logging
 import pydash
 import requests
+from requests.adapters import HTTPAdapter
 
 
 log = logging.getLogger(__name__)
 
 HGVSString = str
+VCFVariantString = str
 
 # VEP_API_BASE_URL_LATEST = "https://rest.ensembl.org"
 VEP_API_BASE_URL_GRCh37 = "https://grch37.rest.ensembl.org"
 
+# Pooled, keep-alive connections shared by every query (and every thread) in the process
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
 
 def hgvs_string(chromosome: str, pos: str | int, ref: str, alt: str) -> HGVSString:
     """Builds variant string in HGVS notation."""
@@ -24,6 +30,20 @@ def hgvs_string(chromosome: str, pos: str | int, ref: str, alt: str) -> HGVSStri
     return f"{chromosome}:g.{pos}{ref}>{alt}"
 
 
+def vcf_variant_string(
+    chromosome: str, pos: str | int, id: str, ref: str, alt: str
+) -> VCFVariantString:
+    """Builds a VCF-style variant string, as accepted by the VEP region endpoint.
+
+    E.g. `"1 1158631 . A G . . ."`. Unlike HGVS notation this needs no
+    translation of REF/ALT, so indels and multi-allelic rows are passed as-is.
+    """
+    if not all((chromosome, pos, ref, alt)):
+        raise RuntimeError
+
+    return f"{chromosome} {pos} {id or '.'} {ref} {alt} . . ."
+
+
 def first_element(data) -> dict:
     """Returns the first element in a list, otherwise returns the unchanged object."""
     if type(data) is list and data:
@@ -42,7 +62,7 @@ def vep_api_hgvs_get(hgvs_string: HGVSString, species: str = "human") -> dict:
     """
     url = f"{VEP_API_BASE_URL_GRCh37}/vep/{species}/hgvs/{hgvs_string}?"
 
-    res = requests.get(url, headers={"Content-Type": "application/json"})
+    res = session.get(url, headers={"Content-Type": "application/json"})
     if not res.ok:
         res.raise_for_status()
 
@@ -72,7 +92,7 @@ def realign_hgvs_inputs_outputs(
 
 
 def batch_vep_hgvs(
-    hgvs_strings: list[HGVSString], species: str = "human"
+    hgvs_strings: list[HGVSString], species: str = "human", timeout: float | None = None
 ) -> list[dict]:
     """Fetch variant consequences for multiple HGVS notations.
 
@@ -82,18 +102,113 @@ def batch_vep_hgvs(
     NOTE: The VEP hgvs API bulk endpoint output is not guaranteed to return the same
     number of outputs as inputs. It appears to filter out queries it can't process
     rather than providing any explicit error messaging.
+
+    `timeout` (seconds) bounds the connection and each wait for response data;
+    `requests.Timeout` is raised if it runs out.
     """
     url = f"{VEP_API_BASE_URL_GRCh37}/vep/{species}/hgvs"
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
     data = {"hgvs_notations": hgvs_strings}
 
-    res = requests.post(url, headers=headers, json=data)
+    res = session.post(url, headers=headers, json=data, timeout=timeout)
     if not res.ok:
         res.raise_for_status()
 
     return res.json()
 
 
+def batch_vep_region(
+    variants: list[VCFVariantString],
+    species: str = "human",
+    timeout: float | None = None,
+) -> list[dict]:
+    """Fetch variant consequences for multiple VCF-style variant strings.
+
+    Endpoint: `POST vep/:species/region`
+    ([VEP API docs](https://grch37.rest.ensembl.org/documentation/info/vep_region_post))
+
+    Each result echoes its variant string in "input", which is used to align
+    results with records (like the hgvs endpoint, rejected variants are omitted).
+    `timeout` works as in `batch_vep_hgvs`.
+    """
+    url = f"{VEP_API_BASE_URL_GRCh37}/vep/{species}/region"
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    data = {"variants": variants}
+
+    res = session.post(url, headers=headers, json=data, timeout=timeout)
+    if not res.ok:
+        res.raise_for_status()
+
+    return res.json()
+
+
+def vep_error_reason(err: requests.HTTPError) -> str:
+    """Extracts the error message from a failed VEP API response, if it has one."""
+    try:
+        return err.response.json()["error"]
+    except (AttributeError, ValueError, KeyError, TypeError):
+        return str(err)
+
+
+def bisect_vep_hgvs(hgvs_strings: list[HGVSString], query=batch_vep_hgvs) -> list[dict]:
+    """Fetch variant consequences for multiple HGVS notations, isolating bad notations.
+
+    If VEP rejects the batch with a 400 (typically caused by a single malformed
+    notation) the batch is split in half and each half is retried recursively, so
+    valid notations are still annotated. Sub-batches which succeed are never re-sent,
+    and each rejected notation yields an error result: `{"input": ..., "error": ...}`.
+
+    `query` is the function used to fetch a single batch (defaults to `batch_vep_hgvs`,
+    `batch_vep_region` works the same way with VCF-style variant strings).
+    """
+    try:
+        return query(hgvs_strings)
+    except requests.HTTPError as err:
+        if err.response is None or err.response.status_code != 400:
+            raise
+
+        reason = vep_error_reason(err)
+        if len(hgvs_strings) == 1:
+            log.warning(f"VEP API rejected HGVS: {hgvs_strings[0]} ({reason})")
+            return [{"input": hgvs_strings[0], "error": reason}]
+
+        log.info(f"VEP API rejected batch of {len(hgvs_strings)}, bisecting: {reason}")
+        mid = len(hgvs_strings) // 2
+        return bisect_vep_hgvs(hgvs_strings[:mid], query) + bisect_vep_hgvs(
+            hgvs_strings[mid:], query
+        )
+
+
+def compact_vep_result(data: dict) -> dict:
+    """The parts of a VEP API result read by the `find_vep_*` functions, for caching.
+
+    Keeps the input, error, allele string and consequence, the first transcript
+    consequence with a gene_id, and the allele frequencies of colocated variants.
+    The `find_vep_*` functions return the same values for the compacted result.
+    """
+    compact = {
+        key: data[key]
+        for key in ("input", "error", "allele_string", "most_severe_consequence")
+        if key in data
+    }
+    if gene_id := find_vep_gene_id(data):
+        compact["transcript_consequences"] = [{"gene_id": gene_id}]
+
+    colocated = [
+        {
+            "frequencies": {
+                allele: {"af": freqs["af"]}
+                for allele, freqs in covar.get("frequencies", {}).items()
+                if "af" in freqs
+            }
+        }
+        for covar in data.get("colocated_variants", [])
+    ]
+    if colocated:
+        compact["colocated_variants"] = colocated
+    return compact
+
+
 def find_vep_gene_id(data: dict) -> str | None:
     """
     Finds the first instance of "gene_id" in the VEP API response.
@@ -0,0 +1,48 @@
+"""Generates synthetic Platypus-style VCF files of arbitrary size.
+
+Usage: `python -m tests.synthetic {num_lines} {outfile}`
+"""
+import re
+import sys
+import random
+from pathlib import Path
+from . import BASE_DIR
+
+
+TEMPLATE_VCF = BASE_DIR.joinpath("data", "test_vcf_data.txt")
+
+
+def template_lines(template: Path = TEMPLATE_VCF) -> tuple[list[str], list[list[str]]]:
+    """Splits a template VCF into its header lines and tab-split data rows."""
+    header, rows = [], []
+    with open(template, "r") as fle:
+        for line in fle:
+            if line.startswith("#"):
+                header.append(line)
+            else:
+                rows.append(line.rstrip("\n").split("\t"))
+    return header, rows
+
+
+def synthetic_vcf(outfile: Path, num_lines: int, template: Path = TEMPLATE_VCF, seed: int = 0):
+    """Writes a VCF with `num_lines` data rows, streamed to disk.
+
+    Rows cycle through the template's records: each cycle shifts POS so the HGVS
+    notations stay distinct, and total coverage (TC) is jittered. Header, INFO and
+    sample columns keep the template's Platypus format.
+    """
+    rng = random.Random(seed)
+    header, rows = template_lines(template)
+
+    with open(outfile, "w") as fle:
+        fle.writelines(header)
+        for i in range(num_lines):
+            cycle, idx = divmod(i, len(rows))
+            row = list(rows[idx])
+            row[1] = str(int(row[1]) + cycle)
+            row[7] = re.sub(r"\bTC=\d+", f"TC={rng.randint(20, 500)}", row[7], count=1)
+            fle.write("\t".join(row) + "\n")
+
+
+if __name__ == "__main__":
+    synthetic_vcf(Path(sys.argv[2]), int(sys.argv[1]))
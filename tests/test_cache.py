@@ -0,0 +1,63 @@
+import threading
+import pytest
+from unittest.mock import MagicMock
+from varanno.cache import VEPResultCache
+
+
+def echo_query(hgvs_strings):
+    return [{"input": hgvs} for hgvs in hgvs_strings]
+
+
+def test_cache_fetch_queries_each_notation_once():
+    cache = VEPResultCache()
+    query = MagicMock(side_effect=echo_query)
+
+    first = cache.fetch(["1:g.1A>G", "1:g.2A>G", "1:g.1A>G"], query)
+    second = cache.fetch(["1:g.2A>G", "1:g.3A>G"], query)
+
+    assert [res["input"] for res in first] == ["1:g.1A>G", "1:g.2A>G", "1:g.1A>G"]
+    assert [res["input"] for res in second] == ["1:g.2A>G", "1:g.3A>G"]
+    assert [call.args[0] for call in query.call_args_list] == [["1:g.1A>G", "1:g.2A>G"], ["1:g.3A>G"]]
+    assert (cache.misses, cache.hits) == (3, 2)
+
+
+def test_cache_coalesces_in_flight_queries():
+    cache = VEPResultCache()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_query(hgvs_strings):
+        started.set()
+        release.wait()
+        return echo_query(hgvs_strings)
+
+    query = MagicMock(side_effect=slow_query)
+    results = {}
+    first = threading.Thread(target=lambda: results.update(a=cache.fetch(["1:g.1A>G"], query)))
+    first.start()
+    started.wait()
+
+    second = threading.Thread(target=lambda: results.update(b=cache.fetch(["1:g.1A>G"], query)))
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+
+    assert query.call_count == 1
+    assert results["a"] == results["b"] == [{"input": "1:g.1A>G"}]
+
+
+def test_cache_does_not_keep_failed_queries():
+    cache = VEPResultCache()
+    with pytest.raises(RuntimeError):
+        cache.fetch(["1:g.1A>G"], MagicMock(side_effect=RuntimeError))
+
+    assert cache.fetch(["1:g.1A>G"], echo_query) == [{"input": "1:g.1A>G"}]
+
+
+def test_cache_stores_compact_results():
+    cache = VEPResultCache()
+    result = {"input": "1:g.1A>G", "most_severe_consequence": "intron_variant", "regulatory_feature_consequences": [{}]}
+
+    assert cache.fetch(["1:g.1A>G"], lambda hgvs_strings: [result]) == [
+        {"input": "1:g.1A>G", "most_severe_consequence": "intron_variant"}
+    ]
@@ -0,0 +1,82 @@
+import json
+import numpy as np
+import pytest
+from unittest.mock import patch
+from varanno.columnar import (
+    annotate_batch_columnar, info_values, format_values, pct_reads_supporting_variant
+)
+from varanno import VCFProcessor
+from varanno.record import Record, annotate_batch, annotation_factory
+from . import BASE_DIR, FIXTURES_DIR
+
+
+@pytest.fixture
+def vep_hgvs_response():
+    with open(FIXTURES_DIR.joinpath("hgvs_response_missing_result.json"), "r") as fle:
+        return json.load(fle)
+
+
+@pytest.fixture
+def records():
+    lines = [
+        "1	1246004	.	A	G	2965	PASS	BRF=0.09;TC=152;TCF=101	GT:GL:GOF:GQ:NR:NV	1/1:-300.0,-41.24,0.0:5:99:152:148",
+        "1	91859795	.	TATGTGA	CATGTGA,CATGTGG	2962	PASS	BRF=0.23;TC=209;TCF=115	GT:GL:GOF:GQ:NR:NV	1/2:-1,-1,-1:1:99:209,209:208,95",
+        "1	1647983	.	TGGCTTAC	AGGCTTAT	2944	PASS	BRF=0.23;TC=131;TCF=5	GT:GL:GOF:GQ:NR:NV	1/0:-291.97,0.0,-298.49:32:99:131:37",
+        "1	1647984	.	G	A	2944	PASS	BRF=0.23;TC=0	GT:GL	0/1:-1,-1,-1",
+    ]
+    return [Record(*line.split("\t")) for line in lines]
+
+
+def test_info_values(records):
+    assert info_values(records, "TC") == ["152", "209", "131", "0"]
+    assert info_values(records, "MQ") == [None, None, None, None]
+
+
+def test_format_values(records):
+    assert format_values(records, "NV") == ["148", "208,95", "37", None]
+
+
+def test_pct_reads_supporting_variant():
+    result = pct_reads_supporting_variant(np.array([148.0, np.nan, 5.0]), np.array([152.0, 10.0, 0.0]))
+    assert result[0] == 97.3684
+    assert np.isnan(result[1:]).all()
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_annotate_batch_columnar(mock_batch_vep_hgvs, records, vep_hgvs_response):
+    mock_batch_vep_hgvs.return_value = vep_hgvs_response
+
+    batch = annotate_batch_columnar(records)
+
+    assert len(batch) == 4
+    assert batch.columns["depth_of_sequence_coverage"].tolist() == [152.0, 209.0, 131.0, 0.0]
+    assert np.isnan(batch.columns["num_reads_supporting_variant"][[1, 3]]).all()
+    assert batch.columns["gene_id"][:3] == ["ENSG00000127054", None, "ENSG00000008128"]
+    assert batch.columns["genotype"] == ["homozygous_alt", "unknown", "heterozygous", "heterozygous"]
+    assert list(batch.to_frame().columns)[-2:] == ["genotype", "vep_error"]
+
+
+def test_annotation_batch_rows_match_annotation_factory(records, vep_hgvs_response):
+    rows = list(annotate_batch_columnar(records[:1], vep_hgvs_response[:1]).rows())
+    assert rows == [annotation_factory(records[0], vep_hgvs_response[0])]
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_annotation_batch_rows_match_annotate_batch(mock_batch_vep_hgvs, records, vep_hgvs_response):
+    mock_batch_vep_hgvs.return_value = vep_hgvs_response
+    expected = list(annotate_batch(records))
+
+    assert list(annotate_batch_columnar(records).rows()) == expected
+    assert expected[1].num_reads_supporting_variant == "208,95"
+    assert expected[3].num_reads_supporting_variant is None
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_columnar(mock_batch_vep_hgvs, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings[1:]]
+    vcf = BASE_DIR.joinpath("data", "test_vcf_data.txt")
+    VCFProcessor(vcf, tmp_path.joinpath("rows")).process()
+    VCFProcessor(vcf, tmp_path.joinpath("columnar"), columnar=True).process()
+
+    rows = tmp_path.joinpath("rows", "annotations.csv").read_text()
+    assert tmp_path.joinpath("columnar", "annotations.csv").read_text() == rows
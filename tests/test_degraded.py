@@ -0,0 +1,105 @@
+import json
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from varanno import VCFProcessor
+from varanno.degraded import (
+    DEGRADED_ERROR, REQUEST_TIMEOUT, CircuitBreaker, backfill, read_retry_queue
+)
+from varanno.record import fetch_vep_results
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+def echo_query(hgvs_strings):
+    return [{"input": hgvs} for hgvs in hgvs_strings]
+
+
+def test_breaker_opens_after_max_failures(tmp_path):
+    queue_file = tmp_path.joinpath("retry_queue.tsv")
+    breaker = CircuitBreaker(queue_file, max_failures=2)
+    fetch = MagicMock(side_effect=requests.ConnectionError)
+
+    results = [breaker.call([f"1:g.{i}A>G"], fetch) for i in range(1, 4)]
+
+    assert fetch.call_count == 2
+    assert breaker.is_open
+    assert results[2] == [{"input": "1:g.3A>G", "error": DEGRADED_ERROR}]
+    assert read_retry_queue(queue_file)["hgvs"] == ["1:g.1A>G", "1:g.2A>G", "1:g.3A>G"]
+
+
+def test_breaker_resets_after_success(tmp_path):
+    breaker = CircuitBreaker(tmp_path.joinpath("retry_queue.tsv"), max_failures=2)
+
+    breaker.call(["1:g.1A>G"], MagicMock(side_effect=requests.ConnectionError))
+    assert breaker.call(["1:g.2A>G"], echo_query) == [{"input": "1:g.2A>G"}]
+    breaker.call(["1:g.3A>G"], MagicMock(side_effect=requests.ConnectionError))
+
+    assert not breaker.is_open
+    assert breaker.num_queued == 2
+
+
+def test_breaker_counts_timeouts_as_failures(tmp_path):
+    breaker = CircuitBreaker(tmp_path.joinpath("retry_queue.tsv"), max_failures=1)
+
+    results = breaker.call(["1:g.1A>G"], MagicMock(side_effect=requests.Timeout))
+
+    assert breaker.is_open
+    assert results == [{"input": "1:g.1A>G", "error": DEGRADED_ERROR}]
+
+
+def test_breaker_raises_unexpected_errors(tmp_path):
+    breaker = CircuitBreaker(tmp_path.joinpath("retry_queue.tsv"))
+
+    with pytest.raises(KeyError):
+        breaker.call(["1:g.1A>G"], MagicMock(side_effect=KeyError("input")))
+    assert breaker.failures == 0
+
+
+@pytest.mark.parametrize("deadline, timeout", [(5.0, 5.0), (None, REQUEST_TIMEOUT)])
+@patch("varanno.record.batch_vep_hgvs")
+def test_breaker_bounds_vep_requests(mock_batch_vep_hgvs, tmp_path, deadline, timeout):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings, timeout: echo_query(hgvs_strings)
+    records = Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt")).load_records()
+    breaker = CircuitBreaker(tmp_path.joinpath("retry_queue.tsv"), deadline=deadline)
+
+    fetch_vep_results(records, breaker=breaker)
+
+    assert mock_batch_vep_hgvs.call_args.kwargs == {"timeout": timeout}
+
+
+@pytest.mark.parametrize("fields", [None, ["INFO.TC"]])
+@patch("varanno.record.batch_vep_hgvs")
+def test_degraded_run_and_backfill(mock_batch_vep_hgvs, tmp_path, fields):
+    with open(FIXTURES_DIR.joinpath("hgvs_response.json"), "r") as fle:
+        vep_hgvs_response = json.load(fle)
+
+    mock_batch_vep_hgvs.side_effect = requests.ConnectionError
+    processor = VCFProcessor(FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, max_vep_failures=1, fields=fields)
+    processor.process()
+
+    annotations = tmp_path.joinpath("annotations.csv")
+    metadata = json.loads(tmp_path.joinpath("metadata.json").read_text())
+    num_rows = len(annotations.read_text().splitlines()) - 1
+    assert mock_batch_vep_hgvs.call_count == 1
+    assert annotations.read_text().count(DEGRADED_ERROR) == num_rows
+    assert metadata["run"]["num_queued_for_backfill"] == num_rows
+
+    mock_batch_vep_hgvs.side_effect = None
+    mock_batch_vep_hgvs.return_value = vep_hgvs_response
+    assert backfill(tmp_path, batch_size=num_rows) == 0
+
+    summary = json.loads(tmp_path.joinpath("summary.json").read_text())
+    assert DEGRADED_ERROR not in annotations.read_text()
+    assert len(annotations.read_text().splitlines()) - 1 == num_rows
+    assert summary["gene_id"]
+    assert not tmp_path.joinpath("retry_queue.tsv").exists()
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"output_format": "vcf"}, {"store": "annotations.db"}, {"stream_output": True}],
+)
+def test_degraded_mode_requires_csv_output(tmp_path, options):
+    with pytest.raises(ValueError, match="Degraded mode"):
+        VCFProcessor(FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, vep_deadline=10, **options)
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from varanno import VCFProcessor
+from varanno.extsort import chrom_key, sort_annotations
+from varanno.record import annotation_factory
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+@pytest.fixture
+def unsorted_vcf(tmp_path):
+    """test_vcf_min.txt as per-chromosome call sets concatenated out of order."""
+    lines = FIXTURES_DIR.joinpath("test_vcf_min.txt").read_text().splitlines()
+    header = [line for line in lines if line.startswith("#")]
+    data = [line.split("\t") for line in lines if not line.startswith("#")]
+    for i, row in enumerate(data):
+        row[0] = ["10", "X", "2", "1"][i % 4]
+    data.sort(key=lambda row: ["10", "X", "2", "1"].index(row[0]))
+
+    path = tmp_path.joinpath("unsorted.vcf")
+    path.write_text("\n".join([*header, *("\t".join(row) for row in data)]) + "\n")
+    return path
+
+
+def test_chrom_key():
+    chroms = ["MT", "chrX", "10", "GL000192.1", "2", "Y", "chr1"]
+    assert sorted(chroms, key=chrom_key) == ["chr1", "2", "10", "chrX", "Y", "MT", "GL000192.1"]
+
+
+@pytest.mark.parametrize("buffer_mb", [256, 0.001])
+def test_sort_annotations(unsorted_vcf, tmp_path, buffer_mb):
+    reader = Reader(unsorted_vcf, keep_lines=True)
+    rows = [
+        (rec, annotation_factory(rec, {}), {"INFO_TC": (1, None)})
+        for rec in reader.read()
+    ]
+    spill_dir = tmp_path.joinpath("spill")
+    spill_dir.mkdir()
+
+    sorted_rows = list(sort_annotations(iter(rows), buffer_mb, spill_dir))
+
+    expected = sorted(rows, key=lambda row: (chrom_key(row[1].CHROM), int(row[1].POS)))
+    assert [row[1] for row in sorted_rows] == [row[1] for row in expected]
+    assert [row[0].line for row in sorted_rows] == [row[0].line for row in expected]
+    assert sorted_rows[0][2] == {"INFO_TC": (1, None)}
+    assert not any(spill_dir.iterdir())
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_sort_output(mock_batch_vep_hgvs, unsorted_vcf, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    VCFProcessor(
+        unsorted_vcf, tmp_path.joinpath("csv"), sort_output=True, sort_buffer=0.001
+    ).process()
+    VCFProcessor(
+        unsorted_vcf, tmp_path.joinpath("vcf"), sort_output=True, sort_buffer=0.001,
+        output_format="vcf",
+    ).process()
+
+    df = pd.read_csv(tmp_path.joinpath("csv", "annotations.csv"), dtype={"CHROM": str})
+    assert df["CHROM"].tolist() == ["1"] * 4 + ["2"] * 4 + ["10"] * 4 + ["X"] * 4
+    assert df.groupby("CHROM", sort=False)["POS"].apply(lambda pos: pos.is_monotonic_increasing).all()
+
+    lines = tmp_path.joinpath("vcf", "annotations.vcf").read_text().splitlines()
+    data = [line.split("\t") for line in lines if not line.startswith("#")]
+    assert [row[:2] for row in data] == df[["CHROM", "POS"]].astype(str).values.tolist()
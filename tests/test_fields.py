@@ -0,0 +1,74 @@
+import csv
+import pytest
+from unittest.mock import patch
+from varanno import AnnotationStore, VCFProcessor
+from varanno.fields import FieldError, FieldExtractor, FieldSpec, format_value, parse_field
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+@pytest.fixture
+def reader():
+    reader = Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt"))
+    reader.read_header()
+    return reader
+
+
+def echo_vep(hgvs_strings):
+    return [{"input": h} for h in hgvs_strings]
+
+
+def test_parse_field(reader):
+    assert parse_field("INFO.QD", reader.metadata) == FieldSpec("INFO", "QD", "1", "Float")
+    assert parse_field("FORMAT.GQ", reader.metadata) == FieldSpec("FORMAT", "GQ", ".", "Integer")
+
+    with pytest.raises(FieldError):
+        parse_field("INFO.NOPE", reader.metadata)
+    with pytest.raises(FieldError):
+        parse_field("QD", reader.metadata)
+
+
+def test_field_extractor(reader):
+    extractor = FieldExtractor.from_metadata(
+        ["INFO.QD", "INFO.TC", "INFO.MQ", "INFO.SC", "FORMAT.GQ", "FORMAT.NR"], reader.metadata
+    )
+    rows = extractor.extract(reader.load_records())
+
+    assert extractor.columns == ["INFO_QD", "INFO_TC", "INFO_MQ", "INFO_SC", "FORMAT_GQ", "FORMAT_NR"]
+    assert rows[0] == {
+        "INFO_QD": 20.0,
+        "INFO_TC": 160,
+        "INFO_MQ": (59.75,),
+        "INFO_SC": "CACTTTCCTCATCCACTTTGA",
+        "FORMAT_GQ": (99,),
+        "FORMAT_NR": (160,),
+    }
+    assert extractor.sql_types["INFO_TC"] == "INTEGER"
+    assert extractor.sql_types["INFO_MQ"] == "TEXT"
+
+
+def test_field_extractor_flags_and_missing_values(reader):
+    flag = FieldSpec("INFO", "DB", "0", "Flag")
+    values = FieldSpec("INFO", "AF", "A", "Float")
+    extractor = FieldExtractor([flag, values, FieldSpec("INFO", "TC", "1", "Integer")])
+    record = reader.load_records()[0]
+
+    record.INFO = "DB;AF=0.5,.;TC=abc"
+    assert extractor.extract([record]) == [{"INFO_DB": True, "INFO_AF": (0.5, None), "INFO_TC": None}]
+    record.INFO = "TC=."
+    assert extractor.extract([record]) == [{"INFO_DB": False, "INFO_AF": None, "INFO_TC": None}]
+    assert format_value((0.5, None)) == "0.5,."
+
+
+@patch("varanno.record.batch_vep_hgvs", new=echo_vep)
+def test_VCFProcessor_extra_fields(tmp_path):
+    infile = FIXTURES_DIR.joinpath("test_vcf_min.txt")
+    VCFProcessor(infile, tmp_path, fields=["INFO.QD", "FORMAT.GQ"]).process()
+    VCFProcessor(infile, tmp_path, fields=["INFO.QD"], store=tmp_path.joinpath("annotations.db")).process()
+
+    with open(tmp_path.joinpath("annotations.csv"), newline="") as fle:
+        row = next(csv.DictReader(fle))
+    assert (row["INFO_QD"], row["FORMAT_GQ"]) == ("20.0", "99")
+
+    with AnnotationStore(tmp_path.joinpath("annotations.db")) as store:
+        assert store.conn.execute("SELECT typeof(INFO_QD), MAX(INFO_QD) FROM annotations").fetchone()[0] == "real"
@@ -0,0 +1,43 @@
+import pytest
+from varanno.filters import parse_filter, FilterExpressionError
+from varanno.record import Record
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+@pytest.fixture
+def record():
+    line = "1	1647722	.	GCTGTGACA	TCTAGGATG	2914	alleleBias	BRF=0.27;MQ=52.53;TC=259	GT:GL:GOF:GQ:NR:NV	0/1:-1,-1,-1:36:99:259:60"
+    return Record(*line.split("\t"))
+
+
+@pytest.mark.parametrize("expr, result", [
+    ("FILTER==PASS", False),
+    ("FILTER!=PASS", True),
+    ("QUAL>=2900", True),
+    ("QUAL > 2914", False),
+    ("CHROM in 1,2,X", True),
+    ("CHROM==2", False),
+    ("INFO.TC>100", True),
+    ("INFO.MQ<50", False),
+    ("INFO.QD>1", False),
+    ("GT==heterozygous", True),
+    ("GT!=homozygous_ref", True),
+])
+def test_record_filter(record, expr, result):
+    assert parse_filter(expr)(record) is result
+
+
+@pytest.mark.parametrize("expr", ["POS>1", "QUAL=>3", "QUAL>"])
+def test_parse_filter_fails_for_invalid_expression(expr):
+    with pytest.raises(FilterExpressionError):
+        parse_filter(expr)
+
+
+def test_reader_applies_filters():
+    reader = Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt"), filters=["FILTER==PASS", "QUAL>=2960"])
+    records = list(reader.read())
+
+    assert records
+    assert all(rec.FILTER == "PASS" and float(rec.QUAL) >= 2960 for rec in records)
+    assert len(records) + reader.num_filtered == len(list(Reader(reader.infile).read()))
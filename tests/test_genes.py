@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+from varanno import GeneIndex, VCFProcessor
+from varanno.genes import load_gene_index, read_gene_intervals
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+GTF = (
+    "#!genome-build GRCh37\n"
+    '1\tensembl\tgene\t1150000\t1250000\t.\t+\t.\tgene_id "ENSG_OUTER"; gene_name "OUTER";\n'
+    '1\tensembl\ttranscript\t1150000\t1250000\t.\t+\t.\tgene_id "ENSG_OUTER"; transcript_id "T1";\n'
+    '1\tensembl\tgene\t1158000\t1159000\t.\t-\t.\tgene_id "ENSG_NESTED";\n'
+    '1\tensembl\tgene\t1580000\t1650000\t.\t+\t.\tgene_id "ENSG_CDK11";\n'
+    '2\tensembl\tgene\t100\t200\t.\t+\t.\tgene_id "ENSG_CHR2";\n'
+)
+
+
+@pytest.fixture
+def gtf_path(tmp_path):
+    path = tmp_path.joinpath("genes.gtf")
+    path.write_text(GTF)
+    return path
+
+
+def test_read_gene_intervals_bed(tmp_path):
+    path = tmp_path.joinpath("genes.bed")
+    path.write_text("track name=genes\nchr1\t99\t200\tGENE_A\n")
+    assert list(read_gene_intervals(path)) == [("1", 100, 200, "GENE_A")]
+
+
+def test_gene_index_lookup(gtf_path):
+    index = GeneIndex.from_file(gtf_path)
+    assert len(index) == 4
+    assert index.lookup("1", 1158631) == "ENSG_NESTED"
+    assert index.lookup("chr1", 1159500) == "ENSG_OUTER"
+    assert index.lookup("1", 1387667) is None
+    assert index.lookup("X", 1158631) is None
+
+
+def test_gene_index_lookup_many_matches_lookup(gtf_path):
+    index = GeneIndex.from_file(gtf_path)
+    rng = np.random.default_rng(0)
+    chroms = rng.choice(["1", "2", "X"], 1000).tolist()
+    positions = rng.integers(1, 1_700_000, 1000)
+
+    assert index.lookup_many(chroms, positions) == [
+        index.lookup(chrom, pos) for chrom, pos in zip(chroms, positions)
+    ]
+
+
+def test_gene_index_save_load(gtf_path, tmp_path):
+    GeneIndex.from_file(gtf_path).save(tmp_path.joinpath("genes.idx"))
+    index = load_gene_index(str(tmp_path.joinpath("genes.idx")))
+
+    assert isinstance(index.starts, np.memmap)
+    assert index.lookup("2", 150) == "ENSG_CHR2"
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_gene_index_fallback(mock_batch_vep_hgvs, gtf_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    index = GeneIndex.from_file(gtf_path)
+    reader = Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt"))
+
+    rows = [ann.gene_id for ann in reader.annotation_generator(gene_index=index)]
+    columns = [
+        gene_id for batch in reader.annotation_batches(gene_index=index)
+        for gene_id in batch.columns["gene_id"]
+    ]
+
+    assert rows == columns
+    assert rows[:5] == ["ENSG_NESTED", "ENSG_OUTER", "ENSG_OUTER", None, None]
+    assert rows[-1] == "ENSG_CDK11"
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_genes_mode_skips_vep(mock_batch_vep_hgvs, gtf_path, tmp_path):
+    processor = VCFProcessor(
+        FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, query_mode="genes",
+        gene_index=GeneIndex.from_file(gtf_path),
+    )
+    processor.process()
+
+    mock_batch_vep_hgvs.assert_not_called()
+    assert "ENSG_CDK11" in tmp_path.joinpath("annotations.csv").read_text()
+
+    with pytest.raises(ValueError):
+        VCFProcessor("in", tmp_path, query_mode="genes")
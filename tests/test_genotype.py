@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from varanno.genotype import decode_gt, decode_counts, decode_genotypes, GENOTYPE_CLASSES
+from varanno.record import Record
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+@pytest.fixture
+def reader():
+    return Reader(FIXTURES_DIR.joinpath("test_vcf_multisample.txt"))
+
+
+@pytest.fixture
+def genotype_batch(reader):
+    return next(reader.genotype_batches())
+
+
+@pytest.mark.parametrize("gtstr, result", [
+    ("0/1", ((0, 1), False)),
+    ("1|2", ((1, 2), True)),
+    ("./.", ((-1, -1), False)),
+    ("1", ((1,), False)),
+    ("0/200", ((0, 200), False)),
+    ("0/99999", ((0, -1), False)),
+    ("-3/1", ((-1, 1), False)),
+])
+def test_decode_gt(gtstr, result):
+    assert decode_gt(gtstr) == result
+
+
+def test_decode_counts():
+    assert decode_counts("208,95") == (208.0, 95.0)
+    assert np.isnan(decode_counts(".")[0])
+
+
+def test_genotype_batch_shapes(genotype_batch):
+    assert genotype_batch.samples == ("sample_a", "sample_b", "sample_c")
+    assert genotype_batch.gt.shape == (3, 3, 2)
+    assert genotype_batch.phased.shape == (3, 3)
+    assert genotype_batch.nv.shape == (3, 3, 2)
+
+
+def test_genotype_batch_values(genotype_batch):
+    assert genotype_batch.gt[1, 0].tolist() == [1, 2]
+    assert genotype_batch.gt[1, 2].tolist() == [-1, -1]
+    assert genotype_batch.gt[2, 1].tolist() == [1, -2]
+    assert genotype_batch.phased[:, 1].tolist() == [False, True, False]
+    assert genotype_batch.nv[1, 0].tolist() == [208.0, 95.0]
+    assert np.isnan(genotype_batch.nr[1, 2]).all()
+
+
+def test_genotype_codes(genotype_batch):
+    classes = [[GENOTYPE_CLASSES[c] for c in row] for row in genotype_batch.genotype_codes()]
+    assert classes == [
+        ["homozygous_alt", "heterozygous", "homozygous_ref"],
+        ["heterozygous", "heterozygous", "unknown"],
+        ["heterozygous", "homozygous_alt", "homozygous_ref"],
+    ]
+
+
+def test_long_rows(genotype_batch):
+    rows = list(genotype_batch.long_rows())
+    assert len(rows) == 9
+    assert rows[3] == {
+        "CHROM": "1", "POS": "91859795", "ID": ".", "REF": "TATGTGA", "ALT": "CATGTGA,CATGTGG",
+        "sample": "sample_a", "GT": "1/2", "genotype": "heterozygous", "NR": "209,209", "NV": "208,95",
+    }
+    assert rows[5]["GT"] == "./."
+    assert rows[7]["GT"] == "1"
+
+
+def test_decode_genotypes_fails_on_sample_mismatch(reader):
+    records = list(reader.read())
+    with pytest.raises(ValueError):
+        decode_genotypes(records, ("sample_a",))
+
+
+def test_decode_genotypes_large_allele_index():
+    record = Record("1", "100", ".", "A", "G", "50", "PASS", "TC=10", "GT:NV", "0/200:5", ("0/99999:5",))
+    batch = decode_genotypes([record], ("sample_a", "sample_b"))
+
+    assert batch.gt.tolist() == [[[0, 200], [0, -1]]]
+    assert [row["GT"] for row in batch.long_rows()] == ["0/200", "0/."]
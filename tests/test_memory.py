@@ -0,0 +1,78 @@
+"""Memory-scaling regression tests.
+
+Runs `VCFProcessor.process` over synthetic VCFs of growing size with a stubbed VEP
+backend, in a fresh interpreter each time, and checks that peak RSS stays flat.
+The 1M and 10M line runs are slow (and write several GB), so they only run when
+`VARANNO_SLOW_TESTS=1` is set.
+"""
+import os
+import sys
+import subprocess
+import pytest
+from .synthetic import synthetic_vcf
+from . import BASE_DIR
+
+
+slow = pytest.mark.skipif(
+    not os.environ.get("VARANNO_SLOW_TESTS"), reason="set VARANNO_SLOW_TESTS=1 to run"
+)
+
+# Allowed peak RSS growth over the baseline run (allocator noise, lazily imported modules)
+RSS_TOLERANCE_KB = 16 * 1024
+
+PROCESS_SCRIPT = """
+import sys, resource
+from unittest.mock import patch
+from varanno import VCFProcessor
+
+def stub_vep(hgvs_strings):
+    return [{"input": hgvs, "most_severe_consequence": "intron_variant"} for hgvs in hgvs_strings]
+
+# A plain function (not a Mock, which would keep every call's arguments in memory)
+with patch("varanno.record.batch_vep_hgvs", new=stub_vep):
+    VCFProcessor(sys.argv[1], sys.argv[2]).process()
+
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss_kb(tmp_path, num_lines: int) -> int:
+    """Processes a synthetic VCF in a subprocess, returning its peak RSS (KB)."""
+    vcf = tmp_path.joinpath(f"synthetic_{num_lines}.vcf")
+    synthetic_vcf(vcf, num_lines)
+
+    result = subprocess.run(
+        [sys.executable, "-c", PROCESS_SCRIPT, str(vcf), str(tmp_path.joinpath(f"out_{num_lines}"))],
+        cwd=BASE_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        check=True,
+    )
+    vcf.unlink()
+    return int(result.stdout.splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def baseline_rss(tmp_path_factory):
+    return peak_rss_kb(tmp_path_factory.mktemp("baseline"), 10_000)
+
+
+def test_synthetic_vcf(tmp_path):
+    vcf = tmp_path.joinpath("synthetic.vcf")
+    synthetic_vcf(vcf, 12_000)
+
+    lines = vcf.read_text().splitlines()
+    data = [line.split("\t") for line in lines if not line.startswith("#")]
+    assert len(data) == 12_000
+    assert lines[-len(data) - 1].startswith("#CHROM")
+    assert len({(row[0], row[1], row[3], row[4]) for row in data}) > 11_765
+
+
+@pytest.mark.parametrize("num_lines", [
+    100_000,
+    pytest.param(1_000_000, marks=slow),
+    pytest.param(10_000_000, marks=slow),
+])
+def test_peak_rss_is_flat(tmp_path, baseline_rss, num_lines):
+    assert peak_rss_kb(tmp_path, num_lines) <= baseline_rss + RSS_TOLERANCE_KB
@@ -0,0 +1,127 @@
+import json
+import pytest
+from unittest.mock import patch
+from varanno import VCFProcessor, VEPResultCache
+from varanno.planner import BatchLatency, notation_problem, plan_queries, read_batch_latency
+from varanno.record import Record
+from varanno.targets import tag_off_target
+from . import FIXTURES_DIR
+
+
+def record(pos, ref="A", alt="G"):
+    return Record("1", str(pos), ".", ref, alt, "50", "PASS", "TC=10")
+
+
+@pytest.mark.parametrize(
+    "ref, alt, expected",
+    [
+        ("A", "G", None),
+        ("ACA", "a", None),
+        ("A", "G,T", "multi_allelic"),
+        ("A", "<DEL>", "invalid"),
+        ("A", "*", "invalid"),
+        ("A", ".", "invalid"),
+    ],
+)
+def test_notation_problem(ref, alt, expected):
+    assert notation_problem(record(100, ref, alt)) == expected
+
+
+def test_plan_queries():
+    records = [record(pos) for pos in range(100, 110)] + [
+        record(100),
+        record(200, alt="G,T"),
+        record(300, alt="<DEL>"),
+    ]
+    plan = plan_queries(iter(records), batch_size=4, batch_seconds=2.0)
+
+    assert plan.num_records == 13
+    assert plan.num_unique_notations == 12
+    assert plan.num_multi_allelic == 1
+    assert plan.num_invalid_notations == 1
+    assert plan.num_batches == plan.num_query_batches == 4
+    assert plan.estimated_seconds == 8.0
+
+
+def test_plan_queries_off_target():
+    records = [record(pos) for pos in range(100, 110)]
+    for rec in records[2:]:
+        tag_off_target(rec)
+
+    plan = plan_queries(records, batch_size=4, batch_seconds=2.0)
+
+    assert plan.num_records == 10
+    assert plan.num_off_target == 8
+    assert plan.num_unique_notations == 2
+    assert plan.num_batches == 3
+    assert plan.num_query_batches == 1
+    assert plan.estimated_seconds == 2.0
+
+
+def test_plan_queries_spread_off_target():
+    records = [record(pos) for pos in range(100, 112)]
+    for i, rec in enumerate(records):
+        if i % 4:
+            tag_off_target(rec)
+
+    plan = plan_queries(records, batch_size=4, batch_seconds=2.0)
+    assert plan.num_off_target == 9
+    assert plan.num_query_batches == plan.num_batches == 3
+    assert plan.estimated_seconds == 6.0
+
+    cache = VEPResultCache()
+    cache.fetch([records[4].hgvs], lambda notations: [{}] * len(notations))
+    assert plan_queries(records, batch_size=4, cache=cache).num_query_batches == 2
+
+
+def test_plan_queries_cache_earlier_batches():
+    records = [record(100), record(101), record(100), record(101), record(102)]
+    plan = plan_queries(records, batch_size=2, cache=VEPResultCache())
+    assert plan.num_batches == 3
+    assert plan.num_query_batches == 2
+
+
+def test_plan_queries_cache():
+    records = [record(pos) for pos in range(100, 110)]
+    cache = VEPResultCache()
+    cache.fetch([rec.hgvs for rec in records[:7]], lambda notations: [{}] * len(notations))
+
+    plan = plan_queries(records, batch_size=2, cache=cache)
+    assert plan.num_cached_notations == 7
+    assert plan.num_batches == 5
+    assert plan.num_query_batches == 2
+    assert plan.estimated_seconds is None
+
+
+def test_batch_latency():
+    latency = BatchLatency()
+    assert latency.to_dict(50)["mean_batch_seconds"] is None
+
+    for seconds in (1.0, 3.0, 2.0):
+        latency.add(seconds)
+    assert latency.to_dict(50) == {
+        "batch_size": 50, "num_batches": 3, "mean_batch_seconds": 2.0, "max_batch_seconds": 3.0,
+    }
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_dry_run(mock_batch_vep_hgvs, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    vcf = FIXTURES_DIR.joinpath("test_vcf_min.txt")
+    VCFProcessor(vcf, tmp_path.joinpath("run"), batch_size=5).process()
+
+    latency = json.loads(tmp_path.joinpath("run", "metadata.json").read_text())["run"]["vep_latency"]
+    assert latency["batch_size"] == 5
+    assert latency["num_batches"] == 4
+    assert read_batch_latency(str(tmp_path.joinpath("run")), 10) == pytest.approx(
+        latency["mean_batch_seconds"] * 2
+    )
+
+    mock_batch_vep_hgvs.reset_mock()
+    plan = VCFProcessor(vcf, tmp_path.joinpath("dry")).dry_run(str(tmp_path.joinpath("run")))
+
+    mock_batch_vep_hgvs.assert_not_called()
+    assert not tmp_path.joinpath("dry").exists()
+    assert plan.num_records == plan.num_unique_notations == 16
+    assert plan.num_query_batches == 1
+    assert plan.estimated_seconds is not None
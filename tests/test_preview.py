@@ -0,0 +1,78 @@
+import json
+import pytest
+from collections import Counter
+from unittest.mock import patch
+from varanno import VCFProcessor
+from varanno.preview import reservoir_sample, extrapolated_summary, stratum_batches
+from varanno.record import annotate_batch
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+@pytest.fixture
+def records():
+    return Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt")).load_records()
+
+
+def echo_vep(hgvs_strings):
+    return [{"input": h} for h in hgvs_strings]
+
+
+def test_reservoir_sample(records):
+    strata = reservoir_sample(records, 5, seed=1)
+
+    sample = strata["all"].records
+    assert strata["all"].num_records == len(records)
+    assert len(sample) == 5
+    assert [rec.line_no for rec in sample] == sorted(rec.line_no for rec in sample)
+
+
+def test_reservoir_sample_is_uniform(records):
+    counts = Counter(
+        rec.line_no for seed in range(2000) for rec in reservoir_sample(records, 4, seed=seed)["all"].records
+    )
+    expected = 2000 * 4 / len(records)
+    assert all(abs(count - expected) < 0.2 * expected for count in counts.values())
+
+
+def test_reservoir_sample_stratified(records):
+    strata = reservoir_sample(records, 2, stratify="FILTER", seed=1)
+    filters = Counter(rec.FILTER for rec in records)
+
+    assert {key: stratum.num_records for key, stratum in strata.items()} == filters
+    assert all(len(stratum.records) == min(2, filters[key]) for key, stratum in strata.items())
+    assert all(rec.FILTER == key for key, stratum in strata.items() for rec in stratum.records)
+
+    with pytest.raises(ValueError):
+        reservoir_sample(records, 2, stratify="QUAL")
+
+
+@patch("varanno.record.batch_vep_hgvs", new=echo_vep)
+def test_extrapolated_summary(records):
+    strata = reservoir_sample(records, 2, stratify="FILTER", seed=1)
+    batches = list(stratum_batches(strata, batch_size=3))
+    for batch in batches:
+        for annotation in annotate_batch(batch):
+            strata[batch[0].FILTER].summary.add(annotation)
+    summary = extrapolated_summary(strata)
+
+    assert all(len({rec.FILTER for rec in batch}) == 1 for batch in batches)
+    assert summary.num_variants == len(records)
+    assert sum(summary.counts["genotype"].values()) == pytest.approx(len(records), abs=len(strata))
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_preview(mock_batch_vep_hgvs, tmp_path):
+    mock_batch_vep_hgvs.side_effect = echo_vep
+
+    processor = VCFProcessor(FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, preview=4)
+    processor.process()
+
+    summary = json.loads(tmp_path.joinpath("summary.json").read_text())
+    metadata = json.loads(tmp_path.joinpath("metadata.json").read_text())
+    assert len(tmp_path.joinpath("annotations.csv").read_text().splitlines()) == 5
+    assert sum(len(call.args[0]) for call in mock_batch_vep_hgvs.call_args_list) == 4
+    assert summary["num_variants"] == 16
+    assert metadata["run"]["preview"] == {
+        "num_records": 16, "num_sampled": 4, "strata": {"all": {"num_records": 16, "num_sampled": 4}}
+    }
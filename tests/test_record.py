@@ -140,6 +140,7 @@ def test_annotation_factory_complex(complex_record):
         num_reads_supporting_variant="208,95",
         pct_reads_supporting_variant=None,
         genotype="unknown",
+        vep_error="no data",
     )
 
 
@@ -240,6 +241,7 @@ def test_annotate_batch_realigns_records_and_responses(mock_batch_vep_hgvs, reco
             num_reads_supporting_variant="208,95",
             pct_reads_supporting_variant=None,
             genotype="unknown",
+            vep_error="No data returned",
         ),
         VariantAnnotation(
             CHROM="1",
@@ -259,3 +261,23 @@ def test_annotate_batch_realigns_records_and_responses(mock_batch_vep_hgvs, reco
             genotype="heterozygous",
         ),
     ]
+
+
+@patch("varanno.record.batch_vep_hgvs")
+@patch("varanno.record.batch_vep_region")
+def test_annotate_batch_region_mode(mock_batch_vep_region, mock_batch_vep_hgvs, record_snp, record_multi_allele):
+    with open(FIXTURES_DIR.joinpath("vep_response_intergenic.json"), "r") as fle:
+        region_result = json.load(fle)[0]
+    region_result["input"] = record_snp.vcf_variant
+    mock_batch_vep_region.return_value = [region_result]
+
+    results = list(annotate_batch([record_snp, record_multi_allele], query_mode="region"))
+
+    mock_batch_vep_hgvs.assert_not_called()
+    mock_batch_vep_region.assert_called_with([
+        "1 1246004 . A G . . .",
+        "1 91859795 . TATGTGA CATGTGA,CATGTGG . . .",
+    ])
+    assert results[0].hgvs == "1:g.1246004A>G"
+    assert results[0].variant_effect == region_result["most_severe_consequence"]
+    assert results[1].vep_error == "No data returned"
@@ -0,0 +1,72 @@
+import pytest
+from varanno.reference import ReferenceGenome
+from varanno.vcf import Reader, MmapReader
+from . import FIXTURES_DIR
+
+
+SEQUENCE = "TTACACACAGGTCCATTTTGACG"
+
+
+@pytest.fixture
+def reference(tmp_path):
+    """A FASTA with 10 bases per line and its .fai index."""
+    fasta = tmp_path.joinpath("ref.fa")
+    lines = [SEQUENCE[i : i + 10] for i in range(0, len(SEQUENCE), 10)]
+    fasta.write_text(">1 test\n" + "\n".join(lines) + "\n")
+    tmp_path.joinpath("ref.fa.fai").write_text(f"1\t{len(SEQUENCE)}\t8\t10\t11\n")
+
+    with ReferenceGenome(str(fasta)) as genome:
+        yield genome
+
+
+def apply(pos: int, ref: str, alt: str) -> str:
+    return SEQUENCE[: pos - 1] + alt + SEQUENCE[pos - 1 + len(ref) :]
+
+
+def test_fetch(reference):
+    assert reference.fetch("1", 1, 3) == "TTA"
+    assert reference.fetch("chr1", 8, 13) == SEQUENCE[7:13]
+    assert reference.fetch("1", 20, 100) == SEQUENCE[19:]
+    with pytest.raises(KeyError):
+        reference.fetch("2", 1, 3)
+
+
+@pytest.mark.parametrize(
+    "variant, expected",
+    [
+        ((7, "ACA", "A"), (2, "TAC", "T")),  # deletion in a repeat
+        ((9, "A", "ACA"), (2, "T", "TAC")),  # insertion in a repeat
+        ((16, "TTTT", "TTT"), (15, "AT", "A")),  # deletion in a homopolymer
+        ((4, "CAC", "CGC"), (5, "A", "G")),  # padded SNV
+        ((4, "C", "G"), (4, "C", "G")),  # already normalized
+    ],
+)
+def test_normalize(reference, variant, expected):
+    assert reference.normalize("1", *variant) == expected
+    assert apply(*variant) == apply(*expected)
+
+
+def test_normalize_leaves_unmatched_variants(reference):
+    assert reference.normalize("1", 4, "GG", "G") == (4, "GG", "G")
+    assert reference.normalize("2", 4, "CA", "C") == (4, "CA", "C")
+    assert reference.normalize("1", 4, "C", "<DEL>") == (4, "C", "<DEL>")
+
+
+@pytest.mark.parametrize("reader_cls", [Reader, MmapReader])
+def test_reader_normalizes_records(reader_cls, reference, tmp_path):
+    header = FIXTURES_DIR.joinpath("test_vcf_min.txt").read_text().split("\n#CHROM")[0]
+    rows = [
+        "1\t7\t.\tACA\tA\t10\tPASS\tTC=10\tGT\t0/1",
+        "1\t2\t.\tTAC\tT\t10\tPASS\tTC=10\tGT\t0/1",
+    ]
+    vcf = tmp_path.joinpath("indels.vcf")
+    vcf.write_text(
+        header + "\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n" + "\n".join(rows) + "\n"
+    )
+
+    reader = reader_cls(str(vcf), reference=reference)
+    records = reader.load_records()
+
+    assert records[0].hgvs == records[1].hgvs
+    assert (records[0].POS, records[0].REF, records[0].ALT) == ("2", "TAC", "T")
+    assert reader.num_normalized == 1
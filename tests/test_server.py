@@ -0,0 +1,79 @@
+import io
+import threading
+import pytest
+import requests
+from unittest.mock import patch
+from varanno.cache import DEFAULT_CACHE_SIZE
+from varanno.server import AnnotationServer, submit
+from . import FIXTURES_DIR
+
+
+@pytest.fixture
+def server():
+    server = AnnotationServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def port(server):
+    return server.server_address[1]
+
+
+def echo_query(hgvs_strings):
+    return [{"input": hgvs} for hgvs in hgvs_strings]
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_server_streams_annotations_and_reuses_cache(mock_batch_vep_hgvs, server, port):
+    mock_batch_vep_hgvs.side_effect = echo_query
+    vcf = FIXTURES_DIR.joinpath("test_vcf_min.txt")
+
+    first, second = io.StringIO(), io.StringIO()
+    assert submit(vcf, port=port, out=first)
+    assert submit(vcf, port=port, out=second, filters=["FILTER==PASS"])
+
+    rows = first.getvalue().splitlines()
+    assert rows[0].startswith("CHROM,POS,ID,REF,ALT,hgvs")
+    assert len(rows) == 17
+    assert len(second.getvalue().splitlines()) < len(rows)
+
+    # the second job is served entirely from the warm cache
+    queried = [hgvs for call in mock_batch_vep_hgvs.call_args_list for hgvs in call.args[0]]
+    assert len(queried) == len(set(queried)) == 16
+
+    health = requests.get(f"http://127.0.0.1:{port}/health").json()
+    assert health["jobs"] == 2
+    assert health["cache_size"] == 16
+
+
+def test_server_rejects_invalid_jobs(port):
+    assert not submit(FIXTURES_DIR.joinpath("not_a_vcf_file.txt"), port=port, out=io.StringIO())
+    assert not submit(FIXTURES_DIR.joinpath("test_vcf_min.txt"), port=port, out=io.StringIO(), filters=["POS>1"])
+
+    res = requests.post(f"http://127.0.0.1:{port}/annotate", data="not json")
+    assert res.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"batch_size": "ten"},
+        {"batch_size": 0},
+        {"batch_size": 2.5},
+        {"query_mode": "vcf"},
+        {"query_mode": "genes"},
+    ],
+)
+def test_server_rejects_invalid_job_options(port, options):
+    job = {"infile": str(FIXTURES_DIR.joinpath("test_vcf_min.txt")), **options}
+    res = requests.post(f"http://127.0.0.1:{port}/annotate", json=job)
+    assert res.status_code == 400
+    assert res.json()["error"].startswith("Invalid job")
+
+
+def test_server_cache_is_bounded(server):
+    assert server.cache.max_size == DEFAULT_CACHE_SIZE
@@ -0,0 +1,75 @@
+import pytest
+import requests
+from unittest.mock import patch
+from varanno import AnnotationStore, VCFProcessor, VariantAnnotation, process_many
+from . import FIXTURES_DIR
+
+
+def annotation(pos: str, gene_id: str, effect: str) -> VariantAnnotation:
+    return VariantAnnotation(
+        CHROM="1", POS=pos, ID=".", REF="A", ALT="G", hgvs=f"1:g.{pos}A>G",
+        gene_id=gene_id, allele_string="A/G", variant_type="substitution",
+        variant_effect=effect, minor_allele_frequency=None, depth_of_sequence_coverage=100.0,
+        num_reads_supporting_variant=50.0, pct_reads_supporting_variant=50.0, genotype="heterozygous",
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    with AnnotationStore(tmp_path.joinpath("annotations.db")) as store:
+        store.insert("s1", [annotation("100", "ENSG1", "missense_variant"), annotation("2000", "ENSG2", "intron_variant")])
+        store.insert("s2", [annotation("100", "ENSG1", "missense_variant")])
+        store.write_metadata("s1", {"fileformat": "VCFv4.0"})
+        store.create_indexes()
+        yield store
+
+
+def test_store_lookups(store):
+    assert [row["sample"] for row in store.by_gene("ENSG1")] == ["s1", "s2"]
+    assert [row["POS"] for row in store.by_region("1", 1000, 3000)] == [2000]
+    assert len(store.by_effect("missense_variant", sample="s2")) == 1
+    assert store.metadata("s1") == {"fileformat": "VCFv4.0"}
+    assert store.metadata("s2") is None
+
+
+def test_store_lookups_use_indexes(store):
+    for sql in (
+        "SELECT * FROM annotations WHERE gene_id = 'ENSG1'",
+        "SELECT * FROM annotations WHERE CHROM = '1' AND POS BETWEEN 1 AND 10",
+        "SELECT * FROM annotations WHERE variant_effect = 'intron_variant'",
+    ):
+        plan = " ".join(row[-1] for row in store.conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        assert "USING INDEX" in plan
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_to_store(mock_batch_vep_hgvs, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    store_file = tmp_path.joinpath("annotations.db")
+    infiles = [FIXTURES_DIR.joinpath("test_vcf_min.txt"), FIXTURES_DIR.joinpath("test_vcf_multisample.txt")]
+
+    assert process_many(infiles, tmp_path, workers=2, store=store_file) == {}
+    # Reloading a sample replaces its rows
+    VCFProcessor(infiles[0], tmp_path.joinpath("test_vcf_min"), store=store_file).process()
+
+    with AnnotationStore(store_file) as store:
+        counts = dict(store.conn.execute("SELECT sample, COUNT(*) FROM annotations GROUP BY sample"))
+        assert store.samples() == ["test_vcf_min", "test_vcf_multisample"]
+        assert store.metadata("test_vcf_min")["run"]["query_mode"] == "hgvs"
+    assert counts["test_vcf_min"] == 16
+    assert not tmp_path.joinpath("test_vcf_min", "annotations.csv").exists()
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_failed_reload_keeps_rows(mock_batch_vep_hgvs, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    store_file = tmp_path.joinpath("annotations.db")
+    infile = FIXTURES_DIR.joinpath("test_vcf_min.txt")
+    VCFProcessor(infile, tmp_path.joinpath("run"), store=store_file, batch_size=5).process()
+
+    mock_batch_vep_hgvs.side_effect = [[{"input": "1:g.1A>G"}], requests.ConnectionError]
+    with pytest.raises(requests.ConnectionError):
+        VCFProcessor(infile, tmp_path.joinpath("run"), store=store_file, batch_size=5).process()
+
+    with AnnotationStore(store_file) as store:
+        assert len(store.query("sample = ?", ("test_vcf_min",))) == 16
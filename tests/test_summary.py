@@ -0,0 +1,69 @@
+import json
+import pytest
+from varanno.record import VariantAnnotation
+from varanno.summary import AnnotationSummary, Histogram
+
+
+def annotation(**kwargs) -> VariantAnnotation:
+    fields = {field: None for field in VariantAnnotation.__slots__}
+    fields.update(CHROM="1", POS="1158631", ID=".", REF="A", ALT="G", hgvs="1:g.1158631A>G")
+    fields.update(kwargs)
+    return VariantAnnotation(**fields)
+
+
+@pytest.fixture
+def annotations():
+    return [
+        annotation(variant_type="SNV_SUB", gene_id="ENSG1", genotype="homozygous_alt",
+                   depth_of_sequence_coverage=160.0, minor_allele_frequency=0.7051),
+        annotation(variant_type="SNV_SUB", gene_id="ENSG2", genotype="heterozygous",
+                   depth_of_sequence_coverage=2500.0, minor_allele_frequency=0.01),
+        annotation(genotype="unknown", depth_of_sequence_coverage=5.0),
+    ]
+
+
+def test_histogram_add():
+    hist = Histogram(0, 1, 20)
+    for value in (0.0, 0.07, 0.99, 1.0, None, "208,95"):
+        hist.add(value)
+
+    assert hist.counts[0] == 1
+    assert hist.counts[1] == 1
+    assert hist.counts[19] == 1
+    assert hist.counts[20] == 1
+    assert hist.missing == 2
+
+
+def test_histogram_merge_fails_on_different_bins():
+    with pytest.raises(ValueError):
+        Histogram(0, 1, 20).merge(Histogram(0, 1, 10))
+
+
+def test_summary_add(annotations):
+    summary = AnnotationSummary()
+    for ann in annotations:
+        summary.add(ann)
+
+    data = summary.to_dict()
+    assert data["num_variants"] == 3
+    assert data["variant_type"] == {"SNV_SUB": 2, "None": 1}
+    assert data["genotype"] == {"homozygous_alt": 1, "heterozygous": 1, "unknown": 1}
+    assert data["depth_of_sequence_coverage"]["counts"][0] == 1
+    assert data["depth_of_sequence_coverage"]["counts"][16] == 1
+    assert data["depth_of_sequence_coverage"]["counts"][-1] == 1
+    assert data["minor_allele_frequency"]["missing"] == 1
+
+
+def test_summary_merge_matches_single_pass(annotations):
+    single = AnnotationSummary()
+    for ann in annotations:
+        single.add(ann)
+
+    shard_a, shard_b = AnnotationSummary(), AnnotationSummary()
+    shard_a.add(annotations[0])
+    for ann in annotations[1:]:
+        shard_b.add(ann)
+
+    # shards round-trip through JSON, as when read back from summary.json files
+    restored = AnnotationSummary.from_dict(json.loads(json.dumps(shard_b.to_dict())))
+    assert shard_a.merge(restored).to_dict() == single.to_dict()
@@ -0,0 +1,136 @@
+import json
+import pytest
+from unittest.mock import patch
+from varanno import VCFProcessor
+from varanno.targets import TargetRegions
+from varanno.vcf import Reader
+from . import FIXTURES_DIR
+
+
+BED = (
+    "track name=targets\n"
+    "chr1\t1158630\t1158631\n"
+    "chr1\t1585000\t1586000\ttarget_2\n"
+    "chr1\t1585900\t1587000\ttarget_3\n"
+    "chr1\t1647700\t1647722\n"
+)
+
+ON_TARGET = ["1158631", "1585597", "1585642", "1586752", "1647722"]
+
+
+@pytest.fixture
+def targets(tmp_path):
+    path = tmp_path.joinpath("targets.bed")
+    path.write_text(BED)
+    return TargetRegions.from_bed(path)
+
+
+def test_target_regions_merged(targets):
+    assert len(targets) == 3
+    assert targets.starts["1"] == [1158631, 1585001, 1647701]
+    assert targets.ends["1"] == [1158631, 1587000, 1647722]
+    assert targets.size == 1 + 2000 + 22
+
+
+@pytest.mark.parametrize(
+    "chrom, pos, expected",
+    [
+        ("1", 1158631, True),
+        ("chr1", 1158631, True),
+        ("1", 1158630, False),
+        ("1", 1585001, True),
+        ("1", 1585000, False),
+        ("1", 1586500, True),
+        ("1", 1647723, False),
+        ("1", 1, False),
+        ("2", 1158631, False),
+    ],
+)
+def test_target_regions_contains(targets, chrom, pos, expected):
+    assert targets.contains(chrom, pos) is expected
+
+
+def test_reader_drops_off_target(targets):
+    reader = Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt"), targets=targets)
+    records = reader.load_records()
+
+    assert [rec.POS for rec in records] == ON_TARGET
+    assert reader.num_off_target == 11
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_reader_tags_off_target(mock_batch_vep_hgvs, targets):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    reader = Reader(
+        FIXTURES_DIR.joinpath("test_vcf_min.txt"), targets=targets, target_mode="tag"
+    )
+    records = reader.load_records()
+
+    assert len(records) == 16
+    assert reader.num_off_target == 11
+    assert records[0].FILTER == "PASS"
+    assert records[1].FILTER == "off_target"
+    assert records[10].FILTER == "alleleBias;off_target"
+
+    annotations = list(reader.annotation_generator())
+    queried = [h for call in mock_batch_vep_hgvs.call_args_list for h in call.args[0]]
+    assert len(queried) == 5
+    assert [ann.POS for ann in annotations if ann.vep_error is None] == ON_TARGET
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_targets(mock_batch_vep_hgvs, targets, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    VCFProcessor(
+        FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, targets=targets
+    ).process()
+
+    metadata = json.loads(tmp_path.joinpath("metadata.json").read_text())
+    assert metadata["run"]["num_off_target_records"] == 11
+    assert len(tmp_path.joinpath("annotations.csv").read_text().splitlines()) == 6
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_targets_tag_vcf_output(mock_batch_vep_hgvs, targets, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    VCFProcessor(
+        FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, targets=targets,
+        target_mode="tag", output_format="vcf",
+    ).process()
+
+    lines = tmp_path.joinpath("annotations.vcf").read_text().splitlines()
+    data = [line.split("\t") for line in lines if not line.startswith("#")]
+    assert '##FILTER=<ID=off_target,Description="Outside target regions">' in lines
+    assert [row[1] for row in data if "off_target" not in row[6].split(";")] == ON_TARGET
+    assert data[10][6] == "alleleBias;off_target"
+
+
+def test_reader_tags_after_filters(targets):
+    reader = Reader(
+        FIXTURES_DIR.joinpath("test_vcf_min.txt"), filters=["FILTER==PASS"],
+        targets=targets, target_mode="tag",
+    )
+    records = reader.load_records()
+    unfiltered = Reader(FIXTURES_DIR.joinpath("test_vcf_min.txt")).load_records()
+
+    assert len(records) == sum(rec.FILTER == "PASS" for rec in unfiltered)
+    assert reader.num_filtered == len(unfiltered) - len(records)
+    assert [rec.POS for rec in records if not rec.is_off_target] == [
+        rec.POS for rec in unfiltered if rec.FILTER == "PASS" and rec.POS in ON_TARGET
+    ]
+    assert any(rec.FILTER == "off_target" for rec in records)
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_dry_run_counts_tagged_batches(mock_batch_vep_hgvs, targets, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    processor = VCFProcessor(
+        FIXTURES_DIR.joinpath("test_vcf_min.txt"), tmp_path, targets=targets,
+        target_mode="tag", batch_size=2,
+    )
+
+    plan = processor.dry_run()
+    processor.process()
+
+    assert plan.num_off_target == 11
+    assert plan.num_query_batches == mock_batch_vep_hgvs.call_count == 4
@@ -1,6 +1,10 @@
+import io
+import os
 import json
+import logging
 import pytest
-from varanno import VCFProcessor
+from varanno import VCFProcessor, process_many
+from varanno.varanno import output_dirs
 from unittest.mock import patch
 from . import FIXTURES_DIR
 
@@ -8,7 +12,7 @@ from . import FIXTURES_DIR
 CSV_HEAD = (
     "CHROM,POS,ID,REF,ALT,hgvs,gene_id,allele_string,variant_type,variant_effect,"
     "minor_allele_frequency,depth_of_sequence_coverage,num_reads_supporting_variant,"
-    "pct_reads_supporting_variant,genotype"
+    "pct_reads_supporting_variant,genotype,vep_error"
 )
 
 
@@ -53,3 +57,140 @@ def test_VCFPRocessor_process(mock_batch_vep_hgvs, tcf_path, tmp_path, vep_hgvs_
 
     csvout = tmp_path.joinpath("annotations.csv")
     assert csvout.read_text().splitlines()[0] == CSV_HEAD
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_multisample(mock_batch_vep_hgvs, tmp_path):
+    mock_batch_vep_hgvs.return_value = []
+
+    processor = VCFProcessor(FIXTURES_DIR.joinpath("test_vcf_multisample.txt"), tmp_path)
+    processor.process()
+
+    lines = tmp_path.joinpath("genotypes.csv").read_text().splitlines()
+    assert lines[0] == "CHROM,POS,ID,REF,ALT,sample,GT,genotype,NR,NV"
+    assert len(lines) == 10
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_multisample_stdin(mock_batch_vep_hgvs, monkeypatch, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    vcf = FIXTURES_DIR.joinpath("test_vcf_multisample.txt")
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(vcf.read_bytes())))
+
+    processor = VCFProcessor("-", tmp_path, batch_size=2)
+    processor.process()
+
+    genotypes = tmp_path.joinpath("genotypes.csv").read_text().splitlines()
+    annotations = tmp_path.joinpath("annotations.csv").read_text().splitlines()
+    assert len(genotypes) == 10
+    assert len(annotations) == 4
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_writes_summary(mock_batch_vep_hgvs, tcf_path, tmp_path, vep_hgvs_response):
+    mock_batch_vep_hgvs.return_value = vep_hgvs_response
+
+    processor = VCFProcessor(tcf_path, tmp_path)
+    processor.process()
+
+    summary = json.loads(tmp_path.joinpath("summary.json").read_text())
+    num_rows = len(tmp_path.joinpath("annotations.csv").read_text().splitlines()) - 1
+    assert summary["num_variants"] == num_rows
+    assert sum(summary["genotype"].values()) == num_rows
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_pipe_mode(mock_batch_vep_hgvs, monkeypatch, capsys, tcf_path, tmp_path, vep_hgvs_response):
+    mock_batch_vep_hgvs.return_value = vep_hgvs_response
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(tcf_path.read_bytes())))
+
+    processor = VCFProcessor("-", tmp_path, stream_output=True)
+    processor.process()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == CSV_HEAD
+    assert len(lines) == len(tcf_path.read_text().splitlines()) - 48
+    assert not tmp_path.joinpath("annotations.csv").exists()
+    assert tmp_path.joinpath("metadata.json").exists()
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_filters_before_query(mock_batch_vep_hgvs, tcf_path, tmp_path):
+    mock_batch_vep_hgvs.return_value = []
+
+    processor = VCFProcessor(tcf_path, tmp_path, filters=["FILTER==alleleBias"])
+    processor.process()
+
+    queried = [hgvs for call in mock_batch_vep_hgvs.call_args_list for hgvs in call.args[0]]
+    metadata = json.loads(tmp_path.joinpath("metadata.json").read_text())
+    assert len(queried) == len(tmp_path.joinpath("annotations.csv").read_text().splitlines()) - 1
+    assert metadata["run"]["filters"] == ["FILTER==alleleBias"]
+    assert metadata["run"]["num_filtered_records"] + len(queried) == 16
+
+
+def test_output_dirs(tmp_path):
+    assert output_dirs(["a/s1.vcf", "b/s2.vcf.gz", "c/s1.vcf"], "out") == [
+        "out/s1", "out/s2", "out/s1_2"
+    ]
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_process_many_dedups_queries_across_files(mock_batch_vep_hgvs, tcf_path, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    infiles = [tcf_path, FIXTURES_DIR.joinpath("test_vcf_multisample.txt")]
+
+    failures = process_many(infiles, tmp_path, workers=2)
+
+    queried = [hgvs for call in mock_batch_vep_hgvs.call_args_list for hgvs in call.args[0]]
+    assert failures == {}
+    assert len(queried) == len(set(queried))
+    assert tmp_path.joinpath("test_vcf_min", "annotations.csv").exists()
+    assert tmp_path.joinpath("test_vcf_multisample", "annotations.csv").exists()
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_process_scopes_logging(mock_batch_vep_hgvs, caplog, tcf_path, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    caplog.set_level(logging.INFO)
+    root_handlers = list(logging.root.handlers)
+
+    processor = VCFProcessor(tcf_path, tmp_path)
+    runs = [processor.process() for _ in range(3)]
+
+    assert logging.root.handlers == root_handlers
+    assert runs[0].keys() == runs[2].keys()
+    assert runs[0]["num_filtered_records"] == runs[2]["num_filtered_records"] == 0
+    log_lines = tmp_path.joinpath("tmp.log").read_text().splitlines()
+    assert sum("Annotating VCF!" in line for line in log_lines) == 3
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_process_many_logs_per_file(mock_batch_vep_hgvs, caplog, tcf_path, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    caplog.set_level(logging.INFO)
+    infiles = [tcf_path, FIXTURES_DIR.joinpath("test_vcf_multisample.txt")] * 4
+    root_handlers = list(logging.root.handlers)
+
+    assert process_many(infiles, tmp_path, workers=4) == {}
+
+    assert logging.root.handlers == root_handlers
+    for dest in output_dirs(infiles, tmp_path):
+        log_text = open(os.path.join(dest, "tmp.log")).read()
+        assert log_text.count("Annotating VCF!") == 1
+        assert f"-> {dest}" in log_text
+
+
+@patch("varanno.record.batch_vep_hgvs")
+def test_process_many_logs_failure_to_its_run(mock_batch_vep_hgvs, caplog, tcf_path, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [{"input": h} for h in hgvs_strings]
+    caplog.set_level(logging.INFO)
+    bad_vcf = tmp_path.joinpath("bad.vcf")
+    bad_vcf.write_text(FIXTURES_DIR.joinpath("not_a_vcf_file.txt").read_text())
+    infiles = [tcf_path, bad_vcf]
+
+    failures = process_many(infiles, tmp_path.joinpath("out"), workers=2)
+
+    assert list(failures) == [bad_vcf]
+    good_dir, bad_dir = output_dirs(infiles, tmp_path.joinpath("out"))
+    assert f"Failed to annotate {bad_vcf}" in open(os.path.join(bad_dir, "tmp.log")).read()
+    assert "Failed to annotate" not in open(os.path.join(good_dir, "tmp.log")).read()
@@ -1,6 +1,8 @@
+import io
 import pytest
+from unittest.mock import patch
 from pathlib import Path
-from varanno.vcf import Reader, ReaderError, Record
+from varanno.vcf import Reader, MmapReader, ReaderError, Record
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -109,3 +111,85 @@ def test_splitrow(header_line):
         "#CHROM", "POS", "ID", "REF", "ALT", "QUAL", 
         "FILTER", "INFO", "FORMAT", "sample"
     )
+
+
+def test_reader_build_record_multisample():
+    reader = Reader()
+    reader.validate_head("#CHROM	POS	ID	REF	ALT	QUAL	FILTER	INFO	FORMAT	a	b	c")
+    rec = reader.build_record("1	1158631	.	A	G	2965	PASS	TC=160	GT:NV	1/1:156	0/1:60	0/0:0")
+    assert reader.samples == ("a", "b", "c")
+    assert rec.SAMPLE == "1/1:156"
+    assert rec.samples == ("1/1:156", "0/1:60", "0/0:0")
+
+
+def test_mmap_reader_matches_text_reader():
+    reader = Reader(VCF_FILE)
+    mmap_reader = MmapReader(VCF_FILE)
+    assert list(mmap_reader.read()) == list(reader.read())
+    assert mmap_reader.header == reader.header
+    assert mmap_reader.metadata == reader.metadata
+
+
+def test_mmap_reader_reports_byte_offset(tmp_path):
+    vcf = tmp_path.joinpath("bad.vcf")
+    vcf.write_bytes(b"##fileformat=VCFv4.0\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n1\t2\t.\n")
+
+    with pytest.raises(ReaderError) as err:
+        list(MmapReader(vcf).read())
+
+    assert err.value.error == "Invalid record format!"
+    assert err.value.line_no == 3
+    assert err.value.offset == 60
+    assert err.value.logstr() == "Invalid record format!: 1\t2\t. [3, byte 60]"
+
+
+def test_mmap_non_vcf_read_fails():
+    with pytest.raises(ReaderError) as err:
+        list(MmapReader(NON_VCF_FILE).read())
+
+    assert err.value.error == "Line format invalid!"
+    assert err.value.text == "Ceci n'est pas un VCF file"
+
+
+def test_reader_read_header():
+    reader = Reader(VCF_FILE)
+    metadata = reader.read_header()
+
+    assert metadata["fileformat"] == "VCFv4.0"
+    assert len(list(reader.meta_structs())) == 25 + 12 + 6
+    assert reader.header[-1] == "sample"
+    assert reader.records == []
+
+    with open(VCF_FILE, "rb") as fle:
+        fle.seek(reader.data_offset)
+        assert fle.readline().startswith(b"1\t1158631\t")
+
+
+@pytest.mark.parametrize("reader_cls", [Reader, MmapReader])
+def test_reader_read_reuses_header(reader_cls):
+    reader = reader_cls(VCF_FILE)
+    reader.read_header()
+
+    with patch.object(reader, "parse_metadata") as mock_parse_metadata:
+        records = list(reader.read())
+
+    mock_parse_metadata.assert_not_called()
+    assert len(records) == 11765
+    assert records[0].line_no == reader.data_line_no + 1
+
+
+def test_reader_read_header_fails_without_header(tmp_path):
+    vcf = tmp_path.joinpath("no_header.vcf")
+    vcf.write_text("##fileformat=VCFv4.0\n")
+
+    with pytest.raises(ReaderError) as err:
+        Reader(vcf).read_header()
+    assert err.value.error == "Missing header line"
+
+
+def test_reader_reads_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(VCF_FILE.read_bytes())))
+    reader = MmapReader("-")
+    records = list(reader.read())
+    assert len(records) == 11765
+    assert reader.metadata["fileformat"] == "VCFv4.0"
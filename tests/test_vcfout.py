@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import patch
+from varanno import VCFProcessor, Record, VariantAnnotation
+from varanno.vcfout import annotated_header, annotated_line, info_header_lines
+from . import FIXTURES_DIR
+
+
+def annotation(**fields) -> VariantAnnotation:
+    values = {field: None for field in VariantAnnotation.__slots__}
+    return VariantAnnotation(**{**values, **fields})
+
+
+def test_annotated_line():
+    line = "1\t100\t.\tA\tG\t50\tPASS\tTC=10\tGT\t0/1"
+    record = Record(*line.split("\t"), line=line)
+    variant = annotation(gene_id="ENSG1", variant_effect="missense_variant", minor_allele_frequency=0.25)
+
+    assert annotated_line(record, variant) == (
+        "1\t100\t.\tA\tG\t50\tPASS\tTC=10;VA_GENE=ENSG1;VA_EFFECT=missense_variant;VA_MAF=0.25\tGT\t0/1\n"
+    )
+    assert annotated_line(record, annotation()) == line + "\n"
+
+
+def test_annotated_line_without_info_or_format():
+    line = "1\t100\t.\tA\tG\t50\tPASS\t."
+    record = Record(*line.split("\t"), line=line)
+
+    assert annotated_line(record, annotation(allele_string="A/G", gene_id="a;b c")) == (
+        "1\t100\t.\tA\tG\t50\tPASS\tVA_GENE=a%3Bb%20c;VA_ALLELES=A/G\n"
+    )
+
+
+def test_annotated_line_rewrites_tagged_filter():
+    line = "1\t100\t.\tA\tG\t50\tPASS\tTC=10\tGT\t0/1"
+    record = Record(*line.split("\t"), line=line)
+    record.FILTER = "off_target"
+
+    assert annotated_line(record, annotation()) == "1\t100\t.\tA\tG\t50\toff_target\tTC=10\tGT\t0/1\n"
+    assert annotated_line(record, annotation(gene_id="ENSG1")) == (
+        "1\t100\t.\tA\tG\t50\toff_target\tTC=10;VA_GENE=ENSG1\tGT\t0/1\n"
+    )
+
+
+def test_annotated_header_declares_filters():
+    header = ['##FILTER=<ID=PASS,Description="All filters passed">', "#CHROM\tPOS"]
+
+    lines = annotated_header(header, {"PASS": "Passed", "off_target": "Outside target regions"}).splitlines()
+    assert lines[:2] == [header[0], '##FILTER=<ID=off_target,Description="Outside target regions">']
+    assert lines[-1] == "#CHROM\tPOS"
+
+
+@pytest.mark.parametrize("reader_backend", ["text", "mmap"])
+@patch("varanno.record.batch_vep_hgvs")
+def test_VCFProcessor_vcf_output(mock_batch_vep_hgvs, reader_backend, tmp_path):
+    mock_batch_vep_hgvs.side_effect = lambda hgvs_strings: [
+        {"input": h, "transcript_consequences": [{"gene_id": "ENSG1"}]} for h in hgvs_strings
+    ]
+    infile = FIXTURES_DIR.joinpath("test_vcf_min.txt")
+
+    VCFProcessor(infile, tmp_path, output_format="vcf", reader_backend=reader_backend).process()
+
+    in_lines = infile.read_text().splitlines()
+    out_lines = tmp_path.joinpath("annotations.vcf").read_text().splitlines()
+    in_data = [line for line in in_lines if not line.startswith("#")]
+    out_data = [line for line in out_lines if not line.startswith("#")]
+
+    assert out_lines[: len(in_lines) - len(in_data) - 1] == in_lines[: len(in_lines) - len(in_data) - 1]
+    assert all(line in out_lines for line in info_header_lines())
+    assert out_lines[len(in_lines) - len(in_data) - 1 + len(info_header_lines())].startswith("#CHROM")
+    assert len(out_data) == len(in_data)
+    for line_in, line_out in zip(in_data, out_data):
+        cols_in, cols_out = line_in.split("\t"), line_out.split("\t")
+        assert cols_out[:7] + cols_out[8:] == cols_in[:7] + cols_in[8:]
+        assert cols_out[7].startswith(cols_in[7])
+    assert all(line.split("\t")[7].endswith(";VA_GENE=ENSG1") for line in out_data)
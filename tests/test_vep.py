@@ -1,9 +1,12 @@
 import json
 import pytest
+import requests
+from unittest.mock import MagicMock, patch
 from varanno.vep import (
     hgvs_string, first_element, find_vep_gene_id, 
     find_vep_allele_string, find_vep_variant_effect, find_vep_maf,
-    realign_hgvs_inputs_outputs
+    realign_hgvs_inputs_outputs, bisect_vep_hgvs, vcf_variant_string,
+    batch_vep_hgvs, batch_vep_region, compact_vep_result
 )
 from . import FIXTURES_DIR
 
@@ -38,6 +41,14 @@ def test_hgvs_string_fails_for_invalid_input():
         hgvs_string("1", None, "A", "G")
 
 
+@pytest.mark.parametrize("args,result", [
+    (("1", "1158631", ".", "A", "G"), "1 1158631 . A G . . ."),
+    (("1", "91859795", "rs1", "TATGTGA", "CATGTGA,CATGTGG"), "1 91859795 rs1 TATGTGA CATGTGA,CATGTGG . . ."),
+])
+def test_vcf_variant_string(args, result):
+    assert vcf_variant_string(*args) == result
+
+
 @pytest.mark.parametrize("input,result", [
     ([{"a": 1, "b": 2}], {"a": 1, "b": 2}),
     ({"a": 1, "b": 2}, {"a": 1, "b": 2}),
@@ -73,3 +84,58 @@ def test_realign_hgvs_inputs_outputs(hgvs_response_missing_result_output):
     assert result[0]["input"] == "1:g.1246004A>G"
     assert result[1]["error"] == "No data returned"
     assert result[2]["input"] == "1:g.1647983_1647991TGGCTTACdelinsAGGCTTAT"
+
+
+def fake_vep_query(bad: set, status_code: int = 400):
+    """Returns a mock batch query which rejects any batch containing a `bad` notation."""
+    def query(hgvs_strings):
+        if bad.intersection(hgvs_strings):
+            response = MagicMock(status_code=status_code)
+            response.json.return_value = {"error": "Unable to parse HGVS notation"}
+            raise requests.HTTPError("400 Client Error", response=response)
+        return [{"input": hgvs} for hgvs in hgvs_strings]
+    return MagicMock(side_effect=query)
+
+
+def test_bisect_vep_hgvs_isolates_bad_notation():
+    hgvs = ["1:g.1A>G", "1:g.2A>G", "1:g.bad", "1:g.4A>G", "1:g.5A>G"]
+    query = fake_vep_query({"1:g.bad"})
+
+    result = bisect_vep_hgvs(hgvs, query)
+
+    assert [res["input"] for res in result] == hgvs
+    assert result[2] == {"input": "1:g.bad", "error": "Unable to parse HGVS notation"}
+    assert [res.get("error") for res in result].count(None) == 4
+
+    # successful sub-batches are never re-sent
+    batches = [call.args[0] for call in query.call_args_list]
+    assert batches == [hgvs, hgvs[:2], hgvs[2:], hgvs[2:3], hgvs[3:]]
+
+
+def test_bisect_vep_hgvs_raises_other_errors():
+    with pytest.raises(requests.HTTPError):
+        bisect_vep_hgvs(["1:g.bad"], fake_vep_query({"1:g.bad"}, status_code=503))
+
+
+@pytest.mark.parametrize("batch_query", [batch_vep_hgvs, batch_vep_region])
+@patch("varanno.vep.session")
+def test_batch_vep_query_timeout(mock_session, batch_query):
+    mock_session.post.return_value.json.return_value = []
+
+    batch_query(["1:g.1A>G"], timeout=5.0)
+    batch_query(["1:g.1A>G"])
+
+    timeouts = [call.kwargs["timeout"] for call in mock_session.post.call_args_list]
+    assert timeouts == [5.0, None]
+
+
+def test_compact_vep_result(vep_hgvs_response):
+    for data in vep_hgvs_response:
+        compact = compact_vep_result(data)
+        alt = data["input"][-1]
+        assert len(json.dumps(compact)) < len(json.dumps(data))
+        assert find_vep_gene_id(compact) == find_vep_gene_id(data)
+        assert find_vep_allele_string(compact) == find_vep_allele_string(data)
+        assert find_vep_variant_effect(compact) == find_vep_variant_effect(data)
+        assert find_vep_maf(compact, alt) == find_vep_maf(data, alt)
+    assert compact_vep_result({"input": "1:g.1A>G", "error": "Bad"}) == {"input": "1:g.1A>G", "error": "Bad"}